@@ -565,6 +565,7 @@ class Dispatcher:
                     try:
                         if not self.must_finish:
                             sock,addr=self.sock.accept()
+                            set_no_delay(sock)
                             tc=TransientChannel(sock, self)
                             self.transient_channels.add(tc)
                     except IOError:
@@ -594,7 +595,16 @@ def create_server_socket(port):
 
 
 def create_client_socket(host, port):
-    return socket.create_connection((host,port))
+    sock=socket.create_connection((host,port))
+    set_no_delay(sock)
+    return sock
+
+#Disables Nagle's algorithm: messages are small and latency matters more than packet count.
+def set_no_delay(sock):
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        pass
 
 #Encodes a list of floats into a sequence of bytes.
 def encode_float_list(lst):
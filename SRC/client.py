@@ -4,34 +4,103 @@ import numpy as np
 JOINTS=11
 STATE_DIMENSION=37
 DEFAULT_PORT=9543
+ROLLOUT_MARKER=-12345.0
+ROLLOUT_RESULT_SIZE=6
+STATE_WIRE_DIMENSION=40
 
 class Client:
     def __init__(self, name, host='localhost', port=DEFAULT_PORT):
         key=name.encode('utf8') #UTF-8 encoded version of the client name.
         self.channel= channel.ClientChannel(host, port, key)
+        self.tick=0 #tick of the last state received from a server in lockstep mode, 0 otherwise.
+        self.answered=True #whether the joints for the last state have already been sent.
+        self.last_joints=None
+        self.period=None #control period and physics substeps of the server simulation profile, from the last state.
+        self.substeps=None
+        self.pending_msg=None #state received while waiting for a rollout reply.
 
     def get_state(self, blocking=True):
+        #In lockstep mode the server waits for an answer to every state: if the caller skipped one, we repeat the last joints.
+        if not self.answered and self.last_joints is not None:
+            self.send_joints(self.last_joints)
         timeout=None
         if blocking: #the method will wait until it receives a message (infinite timeout).
             timeout=-1 #infinite timer
-        last_msg=self.channel.receive(timeout)
+        last_msg=self.pending_msg
+        self.pending_msg=None
         if last_msg is None:
-            return None
+            last_msg=self.channel.receive(timeout)
+            if last_msg is None:
+                return None
         msg=self.channel.receive()
         while msg is not None:
             last_msg=msg
             msg=self.channel.receive()
-        state= channel.decode_float_list(last_msg)
-        return np.array(state)
+        state=np.frombuffer(last_msg, dtype='>f4').astype(np.float64) #network-order floats, decoded in one call.
+        if len(state)>STATE_DIMENSION and state[STATE_DIMENSION]>0:
+            self.tick=int(state[STATE_DIMENSION])
+            self.answered=False
+        else:
+            self.tick=0
+        if len(state)>STATE_DIMENSION+2:
+            self.period=float(state[STATE_DIMENSION+1])
+            self.substeps=int(state[STATE_DIMENSION+2])
+        return state
 
     def send_joints(self, joints):
         joints=list(joints)
         if len(joints)!=JOINTS:
             raise ValueError('Unvalid number of elements')
+        self.last_joints=joints
+        self.answered=True
+        if self.tick:
+            joints=joints+[self.tick] #echo the tick, so that the server knows which state we are answering.
         msg= channel.encode_float_list(joints) #Decode the last message into a list of floats.
         if msg is None:
             raise ValueError('Unvalid joints vector')
         self.channel.send(msg)
 
+    #Asks the server to try each candidate joint vector from the current situation for up to horizon seconds.
+    #Returns one (outcome, ticks, landed, x, y, z) tuple per candidate: outcome +1 if the point would be won, -1 if
+    #lost, 0 otherwise; (x, y, z) is where the ball first touched the table, if landed is 1.
+    def rollout(self, candidates, horizon=3.0):
+        request=[ROLLOUT_MARKER, horizon, len(candidates)]
+        for jp in candidates:
+            if len(jp)!=JOINTS:
+                raise ValueError('Unvalid number of elements')
+            request+=list(jp)
+        self.channel.send(channel.encode_float_list(request))
+        while True:
+            msg=self.channel.receive(-1)
+            if msg is None:
+                return None
+            reply=channel.decode_float_list(msg)
+            if reply and reply[0]==ROLLOUT_MARKER:
+                break
+            self.pending_msg=msg
+        k=int(reply[1])
+        return [tuple(reply[2+i*ROLLOUT_RESULT_SIZE:2+(i+1)*ROLLOUT_RESULT_SIZE]) for i in range(k)]
+
+    def close(self):
+        self.channel.close()
+
+
+#Read-only connection to the spectator port of a server (option -spectate): it receives the states of both players,
+#as sent to them, a few times per second.
+class Spectator:
+    def __init__(self, host='localhost', port=DEFAULT_PORT+1000):
+        self.channel= channel.ClientChannel(host, port, b'spectator')
+
+    #returns the most recent frame as a 2x40 array (row i is the state of player i+1), older frames are skipped.
+    def get_frame(self, blocking=True):
+        last_msg=self.channel.receive(-1 if blocking else None)
+        if last_msg is None:
+            return None
+        msg=self.channel.receive()
+        while msg is not None:
+            last_msg=msg
+            msg=self.channel.receive()
+        return np.frombuffer(last_msg, dtype='>f4').astype(np.float64).reshape(2, STATE_WIRE_DIMENSION)
+
     def close(self):
         self.channel.close()
@@ -0,0 +1,345 @@
+"""
+
+    Machine Learning Project Work: Tennis Table Tournament
+    Group 2:
+        Ciaravola Giosuè - g.ciaravola3@studenti.unisa.it
+        Conato Christian - c.conato@studenti.unisa.it
+        Del Gaudio Nunzio - n.delgaudio5@studenti.unisa.it
+        Garofalo Mariachiara - m.garofalo38@studenti.unisa.it
+
+    ---------------------------------------------------------------
+
+    env.py
+
+    Gym-style environment that runs Playfield and Game in the process of
+    the caller: no sockets, no threads and no wall-clock pacing. An episode
+    is a single point, from the service to the point being decided.
+    VectorEnv steps N of them at once, in the same process or spread over
+    worker processes, with batched NumPy observations.
+    The URDF files are loaded from the same relative paths as server.py,
+    so it must be run from the same directory as the server.
+
+"""
+
+import multiprocessing as mp
+import os
+import random
+import sys
+
+import numpy as np
+
+import server
+
+GAMES = {
+    'normal': server.NormalGame,
+    'instant': server.InstantServeGame,
+    'sameserve': server.SameServeGame,
+    'drill': server.ServeDrillGame,
+}
+OPPONENTS = {
+    'auto': server.AutoPlayerInterface,
+    'dummy': server.DummyPlayerInterface,
+}
+MAX_WAIT_TICKS = 10000
+MAX_DECISION_TICKS = 100
+# contact categories of the info of step(), from the point of view of the environment player (player 1)
+CONTACTS = {
+    'table': server.CONTACT_TABLE,
+    'floor': server.CONTACT_FLOOR,
+    'robot': server.CONTACT_ROBOT[0],
+    'opponent': server.CONTACT_ROBOT[1],
+}
+
+
+class EnvPlayerInterface(server.PlayerInterface):
+    """
+    Player driven by the environment: it plays the joints given to step() and keeps the last state.
+    """
+
+    def __init__(self):
+        self.joints = server.get_neutral_joint_position()
+        self.state = None
+
+    def post_state(self, state):
+        self.state = state
+
+    def get_joints(self):
+        return self.joints
+
+
+class PingPongEnv:
+    """
+    In-process ping pong environment for one player.
+
+    Args:
+        game (str, optional): Game mode, one of GAMES; 'drill' has no opponent.
+        opponent (str, optional): Opponent player, one of OPPONENTS; ignored by the drill.
+        profile (str, optional): Simulation profile (see server.SIM_PROFILES).
+        drill (dict, optional): Drill configuration (see server.ServeDrillGame.set_drill).
+        max_steps (int, optional): Episodes are truncated after this number of steps.
+        seed (int, optional): Seed of the random generator of the game, which is own to the environment.
+    """
+
+    def __init__(self, game='instant', opponent='auto', profile='default', drill=None, max_steps=None,
+                 seed=None):
+        if game not in GAMES:
+            raise ValueError('Unknown game: {}'.format(game))
+        if game != 'drill' and opponent not in OPPONENTS:
+            raise ValueError('Unknown opponent: {}'.format(opponent))
+        self.game_name = game
+        self.opponent_name = opponent
+        self.profile = profile
+        self.drill = drill
+        self.max_steps = max_steps
+        self.observation_size = server.STATE_DIMENSION
+        self.action_size = server.JOINTS
+        self.rng = random.Random(seed)
+        self.playfield = None
+        self.game = None
+        self.player = None
+        self.steps = 0
+        self.create_world()
+
+    def create_world(self):
+        """
+        Builds the playfield and the game, and adds the players; the previous world, if any, is closed.
+        """
+        if self.playfield is not None:
+            self.playfield.close()
+        self.game = GAMES[self.game_name]()
+        self.game.set_rng(self.rng)
+        self.playfield = server.Playfield(self.game, False, self.profile)
+        if self.drill is not None:
+            self.game.set_drill(self.drill)
+        self.player = EnvPlayerInterface()
+        self.game.add_player(self.player, 'Env')
+        if self.game.players_needed > 1:
+            self.game.add_player(OPPONENTS[self.opponent_name](), self.opponent_name)
+
+    def in_play(self):
+        """
+        Whether the ball has been served and the point is not decided yet.
+        """
+        return not self.game.waiting and not self.game.waiting_service
+
+    def observation(self):
+        return np.array(self.player.state[:server.STATE_DIMENSION])
+
+    def reset(self):
+        """
+        Advances the simulation, with the robot in the neutral position, until the next ball is served.
+        A rally still in play (a truncated episode) is aborted without scoring; a new world is created if the
+        game has terminated.
+
+        Returns:
+            np.ndarray: The observation (37 values, see interface.txt) at the first tick of the point.
+        """
+        if self.playfield.finished:
+            self.create_world()
+        elif self.in_play():
+            self.game.abort_point()
+        self.player.joints = server.get_neutral_joint_position()
+        for _ in range(MAX_WAIT_TICKS):
+            self.playfield.step()
+            if self.in_play():
+                self.steps = 0
+                return self.observation()
+        raise RuntimeError('The game did not serve within {} ticks'.format(MAX_WAIT_TICKS))
+
+    def step(self, joints):
+        """
+        Plays one tick with the given joints.
+
+        Args:
+            joints (list or np.ndarray): The 11 joint positions of the robot.
+
+        Returns:
+            tuple: (observation, reward, done, info); the reward is +1 if the point is won, -1 if it is lost,
+                   0 otherwise. info holds the 'score', whether the episode was 'truncated' and the
+                   'contact_times': for every category of CONTACTS touched by the ball in the last tick
+                   simulated, the simulation time at the end of the first physics substep in contact.
+        """
+        game = self.game
+        pf = self.playfield
+        self.player.joints = list(joints)
+        score = list(game.score)
+        pf.step()
+        self.steps += 1
+        done = not self.in_play() or pf.finished
+        if done:
+            # the point is assigned by a game callback a few ticks after the rally ends;
+            # nobody is concerned by a void rally.
+            for _ in range(MAX_DECISION_TICKS):
+                if game.score != score or pf.finished or game.concerned_player < 0:
+                    break
+                pf.step()
+        reward = float((game.score[0] - score[0]) - (game.score[1] - score[1]))
+        truncated = not done and self.max_steps is not None and self.steps >= self.max_steps
+        contact_times = {}
+        for name, bit in CONTACTS.items():
+            t = pf.get_contact_time(bit)
+            if t is not None:
+                contact_times[name] = t
+        info = {'score': list(game.score), 'truncated': truncated, 'contact_times': contact_times}
+        return self.observation(), reward, done or truncated, info
+
+    def close(self):
+        if self.playfield is not None:
+            self.playfield.close()
+            self.playfield = None
+
+
+def step_envs(envs, actions, obs, rewards, dones, first=0):
+    """
+    Steps a block of environments, resetting the finished ones, and writes the results in the batch arrays.
+
+    Args:
+        envs (list): The environments, stored at rows first, first+1, ... of the arrays.
+        actions, obs, rewards, dones (np.ndarray): Batch arrays of shape [N, 11], [N, 37], [N] and [N].
+        first (int, optional): Row of the first environment.
+
+    Returns:
+        list: The info dicts; the info of a finished episode also holds its 'final_observation'.
+    """
+    infos = []
+    for k, env in enumerate(envs):
+        i = first + k
+        o, r, d, info = env.step(actions[i])
+        if d:
+            info['final_observation'] = o
+            o = env.reset()
+        obs[i] = o
+        rewards[i] = r
+        dones[i] = d
+        infos.append(info)
+    return infos
+
+
+def worker_main(remote, buffers, first, env_kwargs, quiet):
+    """
+    Body of a VectorEnv worker process: it owns a block of environments and serves the commands of the parent.
+    """
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+    actions, obs, rewards, dones = VectorEnv.views(buffers)
+    envs = [PingPongEnv(**kwargs) for kwargs in env_kwargs]
+    try:
+        while True:
+            cmd = remote.recv()
+            if cmd == 'step':
+                remote.send(step_envs(envs, actions, obs, rewards, dones, first))
+            elif cmd == 'reset':
+                for k, env in enumerate(envs):
+                    obs[first + k] = env.reset()
+                remote.send(None)
+            elif cmd == 'close':
+                break
+    finally:
+        for env in envs:
+            env.close()
+        remote.close()
+
+
+class VectorEnv:
+    """
+    N independent PingPongEnv stepped together, each one with its own pybullet client.
+    With workers=0 they all run in the calling process; otherwise they are split in blocks among worker processes,
+    which exchange actions and observations through shared memory.
+    Finished episodes are reset automatically: the observation returned for them is the first of the next episode.
+
+    Args:
+        num_envs (int): Number of environments.
+        workers (int, optional): Number of worker processes, 0 to step the environments in this process.
+        seed (int, optional): Environment i is seeded with seed+i.
+        quiet (bool, optional): Whether to discard the messages printed by the games of the workers.
+        **env_kwargs: Arguments for every PingPongEnv (game, opponent, profile, drill, max_steps).
+    """
+
+    def __init__(self, num_envs, workers=0, seed=None, quiet=True, **env_kwargs):
+        self.num_envs = num_envs
+        self.observation_size = server.STATE_DIMENSION
+        self.action_size = server.JOINTS
+        kwargs = [dict(env_kwargs, seed=None if seed is None else seed + i) for i in range(num_envs)]
+        self.buffers = [mp.RawArray('d', num_envs * server.JOINTS),
+                        mp.RawArray('f', num_envs * server.STATE_DIMENSION),
+                        mp.RawArray('f', num_envs),
+                        mp.RawArray('b', num_envs)]
+        self.actions, self.obs, self.rewards, self.dones = VectorEnv.views(self.buffers)
+        self.envs = []
+        self.remotes = []
+        self.processes = []
+        workers = min(workers, num_envs)
+        if workers == 0:
+            self.envs = [PingPongEnv(**k) for k in kwargs]
+            return
+        ctx = mp.get_context()
+        bounds = np.linspace(0, num_envs, workers + 1).astype(int)
+        for w in range(workers):
+            first, last = bounds[w], bounds[w + 1]
+            remote, child = ctx.Pipe()
+            proc = ctx.Process(target=worker_main, args=(child, self.buffers, first, kwargs[first:last], quiet),
+                               daemon=True)
+            proc.start()
+            child.close()
+            self.remotes.append(remote)
+            self.processes.append(proc)
+
+    @staticmethod
+    def views(buffers):
+        """
+        NumPy views of the shared buffers: actions [N, 11], observations [N, 37], rewards [N] and dones [N].
+        """
+        actions, obs, rewards, dones = buffers
+        return (np.frombuffer(actions, dtype=np.float64).reshape(-1, server.JOINTS),
+                np.frombuffer(obs, dtype=np.float32).reshape(-1, server.STATE_DIMENSION),
+                np.frombuffer(rewards, dtype=np.float32),
+                np.frombuffer(dones, dtype=np.bool_))
+
+    def reset(self):
+        """
+        Resets all the environments.
+
+        Returns:
+            np.ndarray: The observations, shape [N, 37].
+        """
+        if self.remotes:
+            for remote in self.remotes:
+                remote.send('reset')
+            for remote in self.remotes:
+                remote.recv()
+        else:
+            for i, env in enumerate(self.envs):
+                self.obs[i] = env.reset()
+        return self.obs.copy()
+
+    def step(self, actions):
+        """
+        Plays one tick in every environment.
+
+        Args:
+            actions (np.ndarray): The joints of every robot, shape [N, 11].
+
+        Returns:
+            tuple: observations [N, 37], rewards [N], dones [N] and the list of the N info dicts.
+        """
+        self.actions[:] = actions
+        if self.remotes:
+            for remote in self.remotes:
+                remote.send('step')
+            infos = []
+            for remote in self.remotes:
+                infos += remote.recv()
+        else:
+            infos = step_envs(self.envs, self.actions, self.obs, self.rewards, self.dones)
+        return self.obs.copy(), self.rewards.copy(), self.dones.copy(), infos
+
+    def close(self):
+        for remote in self.remotes:
+            remote.send('close')
+        for proc in self.processes:
+            proc.join()
+        for env in self.envs:
+            env.close()
+        self.remotes = []
+        self.processes = []
+        self.envs = []
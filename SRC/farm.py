@@ -0,0 +1,453 @@
+"""
+
+    Machine Learning Project Work: Tennis Table Tournament
+    Group 2:
+        Ciaravola Giosuè - g.ciaravola3@studenti.unisa.it
+        Conato Christian - c.conato@studenti.unisa.it
+        Del Gaudio Nunzio - n.delgaudio5@studenti.unisa.it
+        Garofalo Mariachiara - m.garofalo38@studenti.unisa.it
+
+    ---------------------------------------------------------------
+
+    farm.py
+
+    Launcher that keeps K headless servers busy on one machine, each one
+    on its own port and core, with built-in or external players attached.
+    Crashed workers are restarted and the results of all the matches are
+    collected in a single report.
+
+"""
+
+import csv
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import time
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+DEFAULT_BASE_PORT = 9600
+POLL_TIME = 0.2
+MAX_RESTARTS = 3
+BUILTIN_PLAYERS = ['auto', 'dummy']
+POLICY_PREFIX = 'policy:'
+# client command lines follow the rules of the Windows command line there, the POSIX shell ones elsewhere
+WINDOWS = os.name == 'nt'
+
+
+class Job:
+    """
+    A single match to be played by a worker.
+
+    Args:
+        players (list): Two player specs: 'auto', 'dummy', 'policy:<dir>' (server.py -policy <dir>), or an
+                        external client command where {port} and {name} are replaced when the match starts.
+        server_args (list): Extra command line options for server.py.
+        label (str, optional): Free text copied in the report.
+    """
+
+    def __init__(self, players, server_args, label=''):
+        self.players = list(players)
+        self.server_args = list(server_args)
+        self.label = label
+        self.attempts = 0
+
+
+def is_server_player(player):
+    """
+    Whether a player spec is played inside the server process rather than by an external client.
+    """
+    return player in BUILTIN_PLAYERS or player.startswith(POLICY_PREFIX)
+
+
+def player_names(players):
+    """
+    Names under which the players of a job appear in the output of server.py: the in-process players are
+    added first, as 'Player 1', 'Player 2', ..., and the external clients connect as 'Client <index>'.
+
+    Args:
+        players (list): The player specs of a job.
+
+    Returns:
+        list: The name of every player, in the order of the specs.
+    """
+    names = []
+    count = 0
+    for i, player in enumerate(players):
+        if is_server_player(player):
+            count += 1
+            names.append('Player {}'.format(count))
+        else:
+            names.append('Client {}'.format(i + 1))
+    return names
+
+
+def parse_match_results(lines):
+    """
+    Extracts the outcomes of all the matches played by a server (several with server.py -repeat).
+
+    Args:
+        lines (list): Lines printed by the server (see Game.on_terminate).
+
+    Returns:
+        list: A dict with 'game_time', 'names' and 'scores' for every match that terminated.
+    """
+    results = []
+    game_time = None
+    names = []
+    scores = []
+    in_score = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith('=== Total game time:'):
+            game_time = float(line.split(':', 1)[1].strip(' =\n'))
+        elif line.startswith('=== Final score:'):
+            in_score = True
+            names = []
+            scores = []
+        elif in_score and ' points for ' in line:
+            score, name = line.split(' points for ', 1)
+            scores.append(int(score))
+            names.append(name)
+            in_score = len(scores) < 2
+            if not in_score and game_time is not None:
+                results.append({'game_time': game_time, 'names': names, 'scores': scores})
+                game_time = None
+    return results
+
+
+def parse_match_result(lines):
+    """
+    Extracts the outcome of a match from the output of server.py.
+
+    Args:
+        lines (list): Lines printed by the server (see Game.on_terminate).
+
+    Returns:
+        dict: 'game_time', 'names' and 'scores' of the last match, or None if no match terminated.
+    """
+    results = parse_match_results(lines)
+    return results[-1] if results else None
+
+
+def is_port_free(port):
+    """
+    Checks that nobody is listening on the given port.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(('', port))
+        except OSError:
+            return False
+    return True
+
+
+def quote_argument(arg):
+    """
+    Quotes an argument to be inserted in a client command line.
+    """
+    return subprocess.list2cmdline([arg]) if WINDOWS else shlex.quote(arg)
+
+
+def split_command(command):
+    """
+    The args of subprocess.Popen for a client command line. On Windows the line is passed unchanged, as splitting
+    it with the POSIX rules would strip the backslashes of the paths.
+    """
+    return command if WINDOWS else shlex.split(command)
+
+
+def can_pin():
+    """
+    Whether the OS lets the farm bind a process to a core.
+    """
+    return hasattr(os, 'sched_setaffinity') and hasattr(os, 'sched_getaffinity')
+
+
+def pin_to_core(pid, core):
+    """
+    Binds a process to a core; ignored where the OS does not support it (the Farm warns about it).
+    """
+    if core is None or not hasattr(os, 'sched_setaffinity'):
+        return
+    try:
+        os.sched_setaffinity(pid, {core})
+    except OSError:
+        pass
+
+
+class Worker:
+    """
+    Runs the matches of the farm one after another on a fixed port and core.
+    """
+
+    def __init__(self, index, port, core, log_dir):
+        self.index = index
+        self.port = port
+        self.core = core
+        self.log_path = os.path.join(log_dir, 'worker_{}.log'.format(index))
+        self.server = None
+        self.clients = []
+        self.job = None
+        self.start_time = 0.0
+        self.crashes = 0
+
+    def start(self, job):
+        """
+        Starts the server of a job and its external clients.
+        """
+        self.job = job
+        job.attempts += 1
+        args = [sys.executable, SERVER_PATH, '-nogui', '-port', str(self.port)]
+        client_commands = []
+        for player, name in zip(job.players, player_names(job.players)):
+            if player in BUILTIN_PLAYERS:
+                args.append('-' + player)
+            elif player.startswith(POLICY_PREFIX):
+                args += ['-policy', player[len(POLICY_PREFIX):]]
+            else:
+                client_commands.append(player.format(port=self.port, name=quote_argument(name)))
+        args += job.server_args
+        self.start_time = time.time()
+        with open(self.log_path, 'w') as log:
+            self.server = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT)
+        pin_to_core(self.server.pid, self.core)
+        self.clients = []
+        for command in client_commands:
+            client = subprocess.Popen(split_command(command), stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.DEVNULL)
+            pin_to_core(client.pid, self.core)
+            self.clients.append(client)
+
+    def poll(self):
+        """
+        Returns None while the match is running, the exit code of the server otherwise.
+        """
+        if self.server is None:
+            return None
+        return self.server.poll()
+
+    def stop(self):
+        """
+        Kills the server, if still running, and the external clients.
+        """
+        for proc in [self.server] + self.clients:
+            if proc is not None and proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        self.server = None
+        self.clients = []
+
+    def collect(self):
+        """
+        Reads the outcome of the last match from the server log.
+
+        Returns:
+            dict: The result of the last match (see parse_match_result) with the wall time added, or None.
+                  With server.py -repeat, 'matches' holds the results of all the matches played.
+        """
+        with open(self.log_path) as log:
+            results = parse_match_results(log.readlines())
+        if not results:
+            return None
+        result = dict(results[-1])
+        result['wall_time'] = time.time() - self.start_time
+        result['matches'] = results
+        return result
+
+    def save_crash_log(self):
+        """
+        Keeps the log of a crashed match for later inspection.
+        """
+        self.crashes += 1
+        crash_path = self.log_path[:-len('.log')] + '_crash_{}.log'.format(self.crashes)
+        os.replace(self.log_path, crash_path)
+        return crash_path
+
+
+class Farm:
+    """
+    Plays a queue of jobs on K workers.
+
+    Args:
+        workers (int): Number of servers running at the same time.
+        base_port (int): First port tried for the servers; busy ports are skipped.
+        log_dir (str): Directory for the server logs.
+        pin (bool): Whether to pin every worker to its own core; not supported on Windows and macOS.
+    """
+
+    def __init__(self, workers, base_port=DEFAULT_BASE_PORT, log_dir='farm_logs', pin=True):
+        os.makedirs(log_dir, exist_ok=True)
+        cores = sorted(os.sched_getaffinity(0)) if can_pin() else []
+        if pin and not cores:
+            print('--- Warning: this system cannot pin processes to cores, the workers are not pinned ---')
+        self.workers = []
+        port = base_port
+        for index in range(workers):
+            while not is_port_free(port):
+                port += 1
+            core = cores[index % len(cores)] if pin and cores else None
+            self.workers.append(Worker(index, port, core, log_dir))
+            port += 1
+
+    def run(self, jobs, on_result=None):
+        """
+        Plays all the jobs, restarting the crashed ones up to MAX_RESTARTS times.
+
+        Args:
+            jobs (list): Jobs to be played.
+            on_result (callable, optional): Called with (job, result) as soon as a match ends.
+
+        Returns:
+            list: (job, result) pairs, result being None for the jobs that kept crashing.
+        """
+        pending = list(jobs)
+        results = []
+        idle = list(self.workers)
+        busy = []
+        try:
+            while pending or busy:
+                while pending and idle:
+                    worker = idle.pop(0)
+                    worker.start(pending.pop(0))
+                    busy.append(worker)
+                time.sleep(POLL_TIME)
+                for worker in list(busy):
+                    code = worker.poll()
+                    if code is None:
+                        continue
+                    worker.stop()
+                    busy.remove(worker)
+                    idle.append(worker)
+                    job = worker.job
+                    result = worker.collect() if code == 0 else None
+                    if result is None:
+                        crash_path = worker.save_crash_log()
+                        print('*** Worker {} (port {}) crashed with code {}, log in {}'.format(
+                            worker.index, worker.port, code, crash_path))
+                        if job.attempts <= MAX_RESTARTS:
+                            pending.insert(0, job)
+                            continue
+                    results.append((job, result))
+                    if on_result is not None:
+                        on_result(job, result)
+        finally:
+            for worker in busy:
+                worker.stop()
+        return results
+
+
+def write_report(path, results, elapsed=None, workers=1):
+    """
+    Writes one line per match in a CSV file and prints the scoreboard and throughput summary.
+
+    Args:
+        path (str): CSV file to write.
+        results (list): (job, result) pairs returned by Farm.run.
+        elapsed (float, optional): Wall time taken by the whole farm, used for the throughput.
+        workers (int, optional): Number of workers (one core each) the farm was run with.
+    """
+    wins = {}
+    points = {}
+    game_time = 0.0
+    wall_time = 0.0
+    played = 0
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['label', 'player_1', 'score_1', 'player_2', 'score_2', 'game_time', 'wall_time'])
+        for job, result in results:
+            if result is None:
+                writer.writerow([job.label, job.players[0], '', job.players[1], '', '', ''])
+                continue
+            names = result['names']
+            scores = result['scores']
+            writer.writerow([job.label, names[0], scores[0], names[1], scores[1],
+                             result['game_time'], result['wall_time']])
+            played += 1
+            game_time += result['game_time']
+            wall_time += result['wall_time']
+            for i in [0, 1]:
+                points[names[i]] = points.get(names[i], 0) + scores[i]
+                wins.setdefault(names[i], 0)
+            if scores[0] != scores[1]:
+                winner = names[0] if scores[0] > scores[1] else names[1]
+                wins[winner] += 1
+    print('=== Farm report: {} matches played, {} failed ==='.format(played, len(results) - played))
+    for name in sorted(points):
+        print('   {}: {} wins, {} points'.format(name, wins[name], points[name]))
+    if wall_time > 0.0:
+        print('   simulated/wall time ratio per worker: {:.1f}'.format(game_time / wall_time))
+    if elapsed:
+        rate = played * 3600.0 / elapsed
+        print('   {:.1f} matches/hour, {:.1f} matches/hour/core'.format(rate, rate / workers))
+    print('   results written to', path)
+
+
+def main():
+    '''
+    python farm.py [-workers K] [-matches M] [-port P] [-players A B] [-report file]
+                   [-logs dir] [-nopin] [-- server options]
+
+    Players are 'auto', 'dummy', 'policy:<dir>' (the trained networks of a
+    checkpoint directory, run in the server) or an external client command where {port}
+    and {name} are replaced, e.g. "python train_test/paddle_train.py {name} {port}".
+    Everything after -- is passed to server.py; the default is "-score 11 -speed max".
+    '''
+    workers = os.cpu_count() or 1
+    matches = None
+    base_port = DEFAULT_BASE_PORT
+    players = ['auto', 'auto']
+    report = 'farm_report.csv'
+    log_dir = 'farm_logs'
+    pin = True
+    server_args = ['-score', '11', '-speed', 'max']
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i].lstrip('-')
+        if args[i] == '--':
+            server_args = args[i + 1:]
+            break
+        elif a == 'workers':
+            i += 1
+            workers = int(args[i])
+        elif a == 'matches':
+            i += 1
+            matches = int(args[i])
+        elif a == 'port':
+            i += 1
+            base_port = int(args[i])
+        elif a == 'players':
+            players = args[i + 1:i + 3]
+            i += 2
+        elif a == 'report':
+            i += 1
+            report = args[i]
+        elif a == 'logs':
+            i += 1
+            log_dir = args[i]
+        elif a == 'nopin':
+            pin = False
+        else:
+            print('*** Unvalid command line option:', args[i])
+            sys.exit(1)
+        i += 1
+    if len(players) != 2:
+        print('*** Two players are needed')
+        sys.exit(1)
+    if '-score' not in server_args and '-time' not in server_args:
+        print('*** The matches need a -score or -time limit to end')
+        sys.exit(1)
+    if matches is None:
+        matches = workers
+    jobs = [Job(players, server_args, 'match {}'.format(m + 1)) for m in range(matches)]
+    farm = Farm(workers, base_port, log_dir, pin)
+    start = time.time()
+    results = farm.run(jobs)
+    elapsed = time.time() - start
+    write_report(report, results, elapsed, workers)
+
+
+if __name__ == '__main__':
+    main()
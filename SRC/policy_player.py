@@ -0,0 +1,40 @@
+"""
+
+    Machine Learning Project Work: Tennis Table Tournament
+    Group 2:
+        Ciaravola Giosuè - g.ciaravola3@studenti.unisa.it
+        Conato Christian - c.conato@studenti.unisa.it
+        Del Gaudio Nunzio - n.delgaudio5@studenti.unisa.it
+        Garofalo Mariachiara - m.garofalo38@studenti.unisa.it
+
+    ---------------------------------------------------------------
+
+    policy_player.py
+
+    Player that runs the trained networks inside the server process
+    (server.py -policy <dir>): the joints are computed in the same tick
+    as the state, with no client, socket or reconnection involved.
+    The module imports torch, so the server only imports it when a
+    policy player is requested.
+
+"""
+
+import server
+from utilities.paddle_controller import PaddleController
+
+
+class PolicyPlayerInterface(server.PlayerInterface):
+    """
+    In-process player driven by utilities.paddle_controller.PaddleController.
+
+    Args:
+        models_dir (str, optional): Directory of the checkpoints, with the saved_models_arm, saved_models_smash
+                                    and saved_models_dont_wait subdirectories. Defaults to the nets directory.
+        verbose (bool, optional): Whether to print the decisions taken.
+    """
+
+    def __init__(self, models_dir=None, verbose=False):
+        self.controller = PaddleController(models_dir, verbose)
+
+    def update(self, state):
+        return self.controller.update(state)
@@ -0,0 +1,92 @@
+import time
+
+#phases of a tick, in the order they happen.
+PHASE_PHYSICS=0
+PHASE_CONTACTS=1
+PHASE_GUI=2
+PHASE_BALL=3
+PHASE_RULES=4
+PHASE_STATE=5
+PHASE_SEND=6
+PHASE_RECEIVE=7
+PHASE_JOINTS=8
+PHASE_RECORD=9
+PHASE_TICK=10
+PHASE_NAMES=['physics', 'contacts', 'gui', 'ball', 'rules', 'state', 'send', 'receive', 'joints', 'record', 'tick']
+#bucket k counts the durations in [2^(k-1), 2^k) microseconds, the last one everything longer.
+HISTOGRAM_BUCKETS=24
+
+#Per-phase wall time of the ticks of a playfield, kept in fixed-size log2 histograms: the cost of a tick does not
+#depend on how long the server has been running. The time of a phase is summed over the tick (e.g. over the
+#physics substeps) and added to its histogram when the tick ends.
+class TickProfiler:
+    def __init__(self, name='', period=None):
+        self.name=name
+        self.period=period
+        n=len(PHASE_NAMES)
+        self.histograms=[[0]*HISTOGRAM_BUCKETS for _ in range(n)]
+        self.totals=[0.0]*n
+        self.maxima=[0.0]*n
+        self.tick_times=[0.0]*n
+        self.ticks=0
+        self.missed_deadlines=0
+        self.max_lag=0.0
+        self.drift=0.0
+        self.tick_start=0.0
+        self.last=0.0
+        self.next_dump=time.time()+period if period else None
+
+    def start_tick(self):
+        self.tick_start=self.last=time.perf_counter()
+
+    #charges the time since the previous mark to a phase.
+    def mark(self, phase):
+        now=time.perf_counter()
+        self.tick_times[phase]+=now-self.last
+        self.last=now
+
+    #closes the tick: every phase that ran goes to its histogram; returns True when a periodic dump is due.
+    def end_tick(self):
+        times=self.tick_times
+        times[PHASE_TICK]=time.perf_counter()-self.tick_start
+        for phase, t in enumerate(times):
+            if t>0.0:
+                us=int(t*1e6)
+                self.histograms[phase][min(us.bit_length(), HISTOGRAM_BUCKETS-1)]+=1
+                self.totals[phase]+=t
+                if t>self.maxima[phase]:
+                    self.maxima[phase]=t
+                times[phase]=0.0
+        self.ticks+=1
+        return self.next_dump is not None and self.ticks%50==0 and time.time()>=self.next_dump
+
+    #a tick ended lag seconds after the next one was due; dropped is the part of the lag given up for good.
+    def count_missed_deadline(self, lag=0.0, dropped=0.0):
+        self.missed_deadlines+=1
+        if lag>self.max_lag:
+            self.max_lag=lag
+        self.drift+=dropped
+
+    #upper bound, in microseconds, of the bucket holding the given fraction of the samples of a phase.
+    def percentile(self, phase, fraction):
+        hist=self.histograms[phase]
+        target=fraction*sum(hist)
+        seen=0
+        for k, count in enumerate(hist):
+            seen+=count
+            if seen>=target and count:
+                return 1<<k
+        return 0
+
+    def dump(self):
+        if self.next_dump is not None:
+            self.next_dump=time.time()+self.period
+        print('=== Tick stats %s : %d ticks, %d missed deadlines, max lag %.1f ms, drift %.3f s ===' %
+              (self.name, self.ticks, self.missed_deadlines, self.max_lag*1e3, self.drift))
+        print('   %-9s %9s %9s %9s %9s %9s' % ('phase', 'ticks', 'mean us', 'p50 <us', 'p99 <us', 'max us'))
+        for phase, name in enumerate(PHASE_NAMES):
+            count=sum(self.histograms[phase])
+            if not count:
+                continue
+            print('   %-9s %9d %9.1f %9d %9d %9.0f' % (name, count, self.totals[phase]/count*1e6,
+                  self.percentile(phase, 0.5), self.percentile(phase, 0.99), self.maxima[phase]*1e6))
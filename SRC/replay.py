@@ -0,0 +1,240 @@
+"""
+
+    Machine Learning Project Work: Tennis Table Tournament
+    Group 2:
+        Ciaravola Giosuè - g.ciaravola3@studenti.unisa.it
+        Conato Christian - c.conato@studenti.unisa.it
+        Del Gaudio Nunzio - n.delgaudio5@studenti.unisa.it
+        Garofalo Mariachiara - m.garofalo38@studenti.unisa.it
+
+    ---------------------------------------------------------------
+
+    replay.py
+
+    Plays back a trace recorded with server.py -record in the pybullet GUI,
+    without running the physics: the robots and the ball are teleported to
+    the recorded tick. Any tick, point or rally can be reached directly.
+
+"""
+
+import sys
+import time
+
+import pybullet as p
+
+import server
+import tracefile
+
+FRAME_TIME = 1.0 / 60
+SPEED_STEPS = [0.125, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0]
+
+
+class ReplayGame:
+    """
+    Stand-in for server.Game: the playfield is only used to show the recorded ticks.
+    """
+
+    game_started = False
+
+    def set_playfield(self, playfield):
+        self.playfield = playfield
+
+    def init(self):
+        pass
+
+    def update(self):
+        pass
+
+    def on_quit(self):
+        pass
+
+
+class Replay:
+    """
+    Shows a trace on a playfield at a given speed, seeking in constant time.
+
+    Args:
+        reader (tracefile.TraceReader): The trace to be shown.
+        playfield (server.Playfield): Playfield whose bodies are moved to the recorded positions.
+        speed (float, optional): Playback speed, 1.0 being real time.
+    """
+
+    def __init__(self, reader, playfield, speed=1.0):
+        self.reader = reader
+        self.playfield = playfield
+        self.speed = speed
+        self.paused = False
+        self.base_tick = 0
+        self.base_time = time.time()
+        self.tick = 0
+        for i in [0, 1]:
+            playfield.set_name(i, reader.names[i] or 'Player {}'.format(i + 1))
+
+    def seek(self, tick):
+        """
+        Moves the playback to a tick; the following ticks are timed from now.
+        """
+        self.base_tick = min(max(int(tick), 0), len(self.reader) - 1)
+        self.base_time = time.time()
+        self.show(self.base_tick)
+
+    def seek_rally(self, index):
+        """
+        Moves the playback to the serve of a rally (see TraceReader.rallies).
+        """
+        rallies = self.reader.rallies
+        if rallies:
+            self.seek(rallies[min(max(index, 0), len(rallies) - 1)][0])
+
+    def seek_point(self, index):
+        """
+        Moves the playback one second before the index-th point was scored.
+        """
+        points = self.reader.points
+        if len(points) > 0:
+            tick = points[min(max(index, 0), len(points) - 1)]
+            self.seek(tick - int(1.0 / self.reader.period))
+
+    def set_speed(self, speed):
+        self.seek(self.tick)
+        self.speed = speed
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        self.seek(self.tick)
+
+    def current_tick(self):
+        """
+        Returns the tick to be shown now, computed from the wall time elapsed since the last seek.
+        """
+        if self.paused:
+            return self.tick
+        elapsed = (time.time() - self.base_time) * self.speed
+        tick = self.base_tick + int(elapsed / self.reader.period)
+        return min(tick, len(self.reader) - 1)
+
+    def show(self, tick):
+        """
+        Teleports the robots and the ball to a recorded tick and updates the texts.
+        """
+        self.tick = tick
+        states = self.reader[tick]['states']
+        joints = [states[i, 0:server.JOINTS].tolist() for i in [0, 1]]
+        ball = (states[0, 17:20] + server.PLAYER_ORIGINS[0]).tolist()
+        pf = self.playfield
+        pf.teleport(joints, ball)
+        pf.set_text(0, int(states[0, 34]))
+        pf.set_text(1, int(states[1, 34]))
+        t = int(states[0, 36])
+        rally = self.reader.rally_at(tick)
+        pf.set_central_text('%02d:%02d  rally %d  x%g%s' % (t // 60, t % 60, rally + 1, self.speed,
+                                                            '  paused' if self.paused else ''))
+
+    def handle_keys(self):
+        """
+        p: pause, n/b: next/previous rally, +/-: faster/slower, r: restart from the beginning.
+        """
+        keys = p.getKeyboardEvents(physicsClientId=self.playfield.client)
+
+        def triggered(key):
+            return keys.get(ord(key), 0) & p.KEY_WAS_TRIGGERED
+
+        if triggered('p'):
+            self.toggle_pause()
+        if triggered('n'):
+            self.seek_rally(self.reader.rally_at(self.tick) + 1)
+        if triggered('b'):
+            rally = self.reader.rally_at(self.tick)
+            self.seek_rally(rally - 1 if rally > 0 and self.tick == self.reader.rallies[rally][0] else rally)
+        if triggered('r'):
+            self.seek(0)
+        if triggered('+') or triggered('='):
+            self.set_speed(next((s for s in SPEED_STEPS if s > self.speed), self.speed))
+        if triggered('-'):
+            self.set_speed(next((s for s in reversed(SPEED_STEPS) if s < self.speed), self.speed))
+
+    def run(self):
+        """
+        Plays the trace until the GUI window is closed.
+        """
+        pf = self.playfield
+        while p.isConnected(physicsClientId=pf.client):
+            try:
+                self.handle_keys()
+                tick = self.current_tick()
+                if tick != self.tick:
+                    self.show(tick)
+                pf.update_gui()
+            except p.error:
+                break
+            time.sleep(FRAME_TIME)
+
+
+def print_rallies(reader):
+    """
+    Prints the index of the rallies of a trace.
+    """
+    print('=== {}: {} ticks of {:.3f} s, {} vs {} ==='.format(
+        reader.path, len(reader), reader.period, reader.names[0], reader.names[1]))
+    for i, (start, end, winner) in enumerate(reader.rallies):
+        outcome = reader.names[winner] if winner >= 0 else 'void'
+        print('  rally {:4d}: ticks {:7d}-{:7d} ({:6.1f} s)  {}'.format(
+            i + 1, start, end, (end - start) * reader.period, outcome))
+
+
+def main():
+    '''
+    python replay.py <trace> [-tick N | -time S | -rally K | -point K] [-speed F] [-font R] [-list]
+
+    Rallies and points are numbered from 1; -list only prints the rally index.
+    In the GUI: p pauses, n/b jump to the next/previous rally, +/- change the speed,
+    r restarts and the arrow keys move the camera.
+    '''
+    args = sys.argv[1:]
+    if not args or args[0].startswith('-'):
+        print(main.__doc__)
+        sys.exit(1)
+    path = args[0]
+    seek = ('tick', 0)
+    speed = 1.0
+    only_list = False
+    i = 1
+    while i < len(args):
+        a = args[i].lstrip('-')
+        if a in ['tick', 'time', 'rally', 'point']:
+            i += 1
+            seek = (a, float(args[i]))
+        elif a == 'speed':
+            i += 1
+            speed = float(args[i])
+        elif a == 'font':
+            i += 1
+            server.FONT_SIZE *= float(args[i])
+        elif a == 'list':
+            only_list = True
+        else:
+            print('*** Unvalid command line option:', args[i])
+            sys.exit(1)
+        i += 1
+    reader = tracefile.TraceReader(path)
+    if only_list:
+        print_rallies(reader)
+        return
+    if len(reader) == 0:
+        print('*** Empty trace:', path)
+        sys.exit(1)
+    replay = Replay(reader, server.Playfield(ReplayGame()), speed)
+    kind, value = seek
+    if kind == 'tick':
+        replay.seek(value)
+    elif kind == 'time':
+        replay.seek(reader.tick_at(value))
+    elif kind == 'rally':
+        replay.seek_rally(int(value) - 1)
+    else:
+        replay.seek_point(int(value) - 1)
+    replay.run()
+
+
+if __name__ == '__main__':
+    main()
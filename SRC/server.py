@@ -3,8 +3,15 @@ import pybullet_data as pd
 import time
 import math
 import channel
+import tracefile
+import snapshot_library
+import profiler
 import random
+import threading
 import sys
+import os
+import json
+import numpy as np
 
 DEFAULT_PORT=9543
 JOINT_FORCE=400
@@ -12,7 +19,6 @@ TABLE_HEIGHT=1.0
 TABLE_THICKNESS=0.08
 TABLE_LENGTH=2.4
 TABLE_WIDTH=1.4
-DT=1.0/50
 INITIAL_CAMERA_ANGLE=90.0
 INITIAL_CAMERA_DISTANCE=3.0
 NO_DEADLINE=100.0*365.0*86400.0
@@ -23,20 +29,85 @@ STOPPED_SPEED_THRESHOLD=0.01
 STOPPED_TIME_THRESHOLD=1.0
 DIST_THRESHOLD=3*TABLE_LENGTH
 STATE_DIMENSION=37
+STATE_TICK_INDEX=STATE_DIMENSION
+STATE_PERIOD_INDEX=STATE_DIMENSION+1
+STATE_SUBSTEPS_INDEX=STATE_DIMENSION+2
+STATE_WIRE_DIMENSION=STATE_DIMENSION+3
+STATE_FLOAT=np.float32
+WIRE_FLOAT='>f4'
 BALL_SERVICE_HEIGHT=TABLE_HEIGHT+1.0 
 FONT_SIZE=2.0
+PLAYER_ORIGINS=np.array([[0.0, -1.0, TABLE_HEIGHT], [0.0, +1.0, TABLE_HEIGHT]])
+PLAYER_MIRRORS=np.array([[1.0, 1.0, 1.0], [-1.0, -1.0, 1.0]])
+JOINT_INDICES=list(range(JOINTS))
+JOINT_FORCES=[JOINT_FORCE]*JOINTS
+LOCKSTEP_TICK_LIMIT=1<<24
+LOCKSTEP_FALLBACKS=['hold', 'neutral']
+#what a late playfield does with the ticks it is behind: drop forgets them (the game runs slower than real time),
+#catchup plays them back to back, elastic plays them at most twice as fast as real time. The value is the fraction
+#of the period left between two ticks while catching up.
+CATCHUP_POLICIES={'drop': None, 'catchup': 0.0, 'elastic': 0.5}
+#a playfield further behind than this (seconds) drops the lag whatever the policy.
+CATCHUP_LIMIT=1.0
+#idle worlds kept by the matchmaker for reuse, and its polling time when no match is running.
+MATCHMAKER_POOL_LIMIT=16
+MATCHMAKER_POLL_TIME=0.05
+#with -idlefast, the players get one state every IDLE_STATE_INTERVAL ticks while nothing can score.
+IDLE_STATE_INTERVAL=5
+#frames per second sent to the spectators by default.
+SPECTATOR_RATE=10.0
+#rollout requests and replies start with this value instead of a joint position.
+ROLLOUT_MARKER=-12345.0
+ROLLOUT_MARKER_BYTES=np.array([ROLLOUT_MARKER], dtype=WIRE_FLOAT).tobytes()
+ROLLOUT_HEADER=3
+ROLLOUT_RESULT_SIZE=6
+ROLLOUT_MAX_CANDIDATES=32
+ROLLOUT_MAX_HORIZON=5.0
+#simulation profiles: control rate of the game (ticks per second), physics substeps per tick, solver iterations,
+#contact ERP (None keeps the engine default) and continuous collision detection for the ball.
+SIM_PROFILES={
+    'accurate':   {'hz': 50, 'substeps': 6, 'solver_iterations': 100, 'contact_erp': 0.4, 'ball_ccd': True},
+    'default':    {'hz': 50, 'substeps': 2, 'solver_iterations': 50, 'contact_erp': None, 'ball_ccd': False},
+    'fast-train': {'hz': 25, 'substeps': 2, 'solver_iterations': 10, 'contact_erp': None, 'ball_ccd': True},
+}
+BALL_RADIUS=0.04
+#serve drill: each shot is a distribution of launch positions and targets (in the coordinates of the player, ranges
+#given as [min, max] or fixed values), horizontal speeds and spins; a shot is picked at every serve by weight.
+DRILL_SHOT_DEFAULT={
+    'weight': 1.0,
+    'position': {'x': [-0.3, 0.3], 'y': [2.1, 2.3], 'z': [0.2, 0.5]},
+    'target': {'x': [-0.5, 0.5], 'y': [0.1, 0.7]},
+    'speed': [3.0, 5.0],
+    'spin': {'x': 0.0, 'y': 0.0, 'z': 0.0},
+}
+DRILL_DEFAULT={'interval': 0.0, 'reset_robot': True, 'shots': [DRILL_SHOT_DEFAULT]}
+DRILL_OUTCOMES=['returned', 'missed', 'error', 'void']
+CONTACT_TABLE=1
+CONTACT_FLOOR=2
+CONTACT_ROBOT=[4, 8]
+CONTACT_CATEGORIES=[CONTACT_TABLE, CONTACT_FLOOR, CONTACT_ROBOT[0], CONTACT_ROBOT[1]]
 
 #This class represents the playing field and manages the physics simulation and the graphical interface.
 class Playfield:
-    def __init__(self, game, gui=True):
+    def __init__(self, game, gui=True, profile='default'):
         self.has_gui=gui
+        self.profile=profile
+        self.dt=1.0/SIM_PROFILES[profile]['hz']
+        self.substeps=SIM_PROFILES[profile]['substeps']
         self.init_pybullet()
         self.load_objects()
-        self.cpoints=[]
+        self.init_contacts()
+        self.snapshot=PhysicsSnapshot(self)
         self.camera_angle=INITIAL_CAMERA_ANGLE
         self.camera_distance=INITIAL_CAMERA_DISTANCE
         self.finished=False
         self.sim_time=0.0
+        self.speed=1.0
+        self.catchup='drop'
+        self.drift=0.0
+        self.idle_fast=False
+        self.idle=False
+        self.profiler=None
         self.update_state_cb=None
         self.next_state_cb=None
         self.update_state_deadline=0.0
@@ -48,21 +119,25 @@ class Playfield:
 
     #loads the URDF objects representing the floor, the table, the ball and the two robots. It also sets dynamic properties of objects, such as reversion and lateral friction, and adds debug text to display player names.
     def load_objects(self):
-        self.floor = p.loadURDF('plane.urdf')
+        self.floor = p.loadURDF('plane.urdf', physicsClientId=self.client)
         self.table = p.loadURDF('Ping_Pong_Machine_learning\\SRC\\table.urdf', [0, 0,
-                                               TABLE_HEIGHT-TABLE_THICKNESS])
+                                               TABLE_HEIGHT-TABLE_THICKNESS],
+                                               physicsClientId=self.client)
         self.ball  = p.loadURDF('Ping_Pong_Machine_learning\\SRC\\ball.urdf', [0, 0.1, 2],
-                                flags=p.URDF_USE_INERTIA_FROM_FILE)
+                                flags=p.URDF_USE_INERTIA_FROM_FILE,
+                                physicsClientId=self.client)
         self.robot = [None, None]
         self.robot[0] = p.loadURDF('Ping_Pong_Machine_learning\\SRC\\robot.urdf',
-                                 [0, -0.85-0.5*TABLE_LENGTH, 0.8])
+                                 [0, -0.85-0.5*TABLE_LENGTH, 0.8],
+                                 physicsClientId=self.client)
         rot=p.getQuaternionFromEuler([0,0,math.pi])
         self.robot[1] = p.loadURDF('Ping_Pong_Machine_learning\\SRC\\robot2.urdf',
 
-                                 [0, +0.85+0.5*TABLE_LENGTH, 0.8], rot)
+                                 [0, +0.85+0.5*TABLE_LENGTH, 0.8], rot,
+                                 physicsClientId=self.client)
         self.objects=[self.floor, self.table, self.ball] + self.robot
         for obj in self.objects:
-            for j in range(-1, p.getNumJoints(obj)):
+            for j in range(-1, p.getNumJoints(obj, physicsClientId=self.client)):
                 r=0.95
                 if obj==self.table and j==0:
                     r=0.1
@@ -73,23 +148,85 @@ class Playfield:
                         r=1.1
                 elif obj==self.floor:
                     r=0.7
-                p.changeDynamics(obj, j, restitution=r, lateralFriction=3.0)
+                p.changeDynamics(obj, j, restitution=r, lateralFriction=3.0,
+                                 physicsClientId=self.client)
                 if j>=0:
                     p.setJointMotorControl2(obj,j,p.POSITION_CONTROL,
-                                        -0.2, force=JOINT_FORCE)
+                                        -0.2, force=JOINT_FORCE,
+                                        physicsClientId=self.client)
+        if SIM_PROFILES[self.profile]['ball_ccd']:
+            p.changeDynamics(self.ball, -1, ccdSweptSphereRadius=0.9*BALL_RADIUS,
+                             physicsClientId=self.client)
+        self.motor_targets=[[-0.2]*JOINTS, [-0.2]*JOINTS]
         self.name=["Player 1", "Player 2"]
         self.text=[None, None, None]
         if self.has_gui:
             self.text[0]=p.addUserDebugText(self.name[0],
-                    [0, -TEXT_POS, TEXT_HEIGHT], textSize=FONT_SIZE)
+                    [0, -TEXT_POS, TEXT_HEIGHT], textSize=FONT_SIZE,
+                    physicsClientId=self.client)
             self.text[1]=p.addUserDebugText(self.name[1],
-                    [0, +TEXT_POS, TEXT_HEIGHT], textSize=FONT_SIZE)
+                    [0, +TEXT_POS, TEXT_HEIGHT], textSize=FONT_SIZE,
+                    physicsClientId=self.client)
             self.text[2]=p.addUserDebugText("",
-                    [0, 0.0, TEXT_HEIGHT], textSize=FONT_SIZE)
+                    [0, 0.0, TEXT_HEIGHT], textSize=FONT_SIZE,
+                    physicsClientId=self.client)
+
+    #builds the (body, link) -> contact bit table used to classify the ball contacts and disables the collision
+    #pairs no rule ever reads: robot against robot and robot against floor.
+    #Robot links 0 and 1 are the base slides, a ball touching them counts as touching the floor.
+    def init_contacts(self):
+        self.contact_bits={(self.floor, -1): CONTACT_FLOOR, (self.table, -1): CONTACT_TABLE}
+        links=[list(range(-1, p.getNumJoints(rob, physicsClientId=self.client))) for rob in self.robot]
+        for i in [0, 1]:
+            for j in links[i]:
+                self.contact_bits[(self.robot[i], j)]=CONTACT_FLOOR if j<=1 else CONTACT_ROBOT[i]
+                p.setCollisionFilterPair(self.robot[i], self.floor, j, -1, 0,
+                                         physicsClientId=self.client)
+        for j0 in links[0]:
+            for j1 in links[1]:
+                p.setCollisionFilterPair(self.robot[0], self.robot[1], j0, j1, 0,
+                                         physicsClientId=self.client)
+        self.contact_mask=0
+        self.last_contact_mask=0
+        #substep of the first contact of every category of CONTACT_CATEGORIES, in this tick and in the last one; an
+        #entry only holds if its bit is in the matching mask.
+        self.contact_substep=[0]*len(CONTACT_CATEGORIES)
+        self.last_contact_substep=[0]*len(CONTACT_CATEGORIES)
+        self.last_contact_tick_time=0.0
+
+    #ORs the contact bits of the ball touching anything after the given substep, noting the first one of each category.
+    def collect_contacts(self, substep):
+        mask=0
+        bits=self.contact_bits
+        for cp in p.getContactPoints(self.ball, physicsClientId=self.client):
+            mask|=bits.get((cp[2], cp[4]), 0)
+        new=mask & ~self.contact_mask
+        if new:
+            for i, bit in enumerate(CONTACT_CATEGORIES):
+                if new & bit:
+                    self.contact_substep[i]=substep
+        self.contact_mask|=mask
+
+    #returns the simulation time at the end of the first substep of the last tick in which the ball touched the given
+    #contact category, or None if it did not touch it in the last tick.
+    def get_contact_time(self, bit):
+        if not self.last_contact_mask & bit:
+            return None
+        k=self.last_contact_substep[CONTACT_CATEGORIES.index(bit)]
+        return self.last_contact_tick_time+(k+1)*self.dt/self.substeps
+
+    #measures the phases of every tick, printing a summary every period seconds (never if None) and at the end.
+    def enable_profiler(self, name, period=None):
+        self.profiler=profiler.TickProfiler(name, period)
 
     def update(self):
+        prof=self.profiler
         self.update_gui()
+        if prof:
+            prof.mark(profiler.PHASE_GUI)
         self.update_ball()
+        if prof:
+            prof.mark(profiler.PHASE_BALL)
         if self.update_state_cb:
             if self.sim_time>=self.update_state_deadline:
                 self.update_state_cb=None
@@ -102,43 +239,68 @@ class Playfield:
         self.game.update()
 
     def run(self):
-        ref_time=time.time()
+        run_playfields([self])
+
+    #advances the simulation by one tick (as many physics substeps as the profile asks) and updates the game.
+    #With the idle fast path, while the game is waiting (nothing can score) the contacts are not collected and, in
+    #fast-forward, the physics is not stepped at all once the robots have reached their position.
+    def step(self):
+        prof=self.profiler
+        if prof:
+            prof.start_tick()
+        self.idle=self.idle_fast and self.game.waiting
+        if not (self.idle and self.speed is None and self.update_state_cb is None):
+            for k in range(self.substeps):
+                p.stepSimulation(physicsClientId=self.client)
+                if prof:
+                    prof.mark(profiler.PHASE_PHYSICS)
+                if not self.idle:
+                    self.collect_contacts(k)
+                    if prof:
+                        prof.mark(profiler.PHASE_CONTACTS)
+        self.update()
+        self.sim_time += self.dt
+        if prof and prof.end_tick():
+            prof.dump()
+
+    #called once the playfield will not be stepped anymore: stops the game and releases the physics world.
+    def close(self):
         try:
-          while not self.finished:
-            p.stepSimulation()
-            cpoints = p.getContactPoints(self.ball)
-            if cpoints is not None:
-                self.cpoints += cpoints
-            p.stepSimulation()
-            cpoints = p.getContactPoints(self.ball)
-            if cpoints is not None:
-                self.cpoints += cpoints
-            self.update()
-            self.sim_time += DT
-            now=time.time()
-            dt=ref_time+DT-now
-            if dt<=0.0:
-                ref_time=now
-            else:
-                ref_time += DT
-                time.sleep(dt)
+            self.game.on_quit()
+            if self.profiler:
+                self.profiler.dump()
+            if self.drift>=self.dt:
+                print('--- Warning: the simulation ran %.2f s behind real time ---' % self.drift)
         finally:
-          self.game.on_quit()
+            p.disconnect(physicsClientId=self.client)
+
+    #sets how many times faster than real time the simulation runs; None means as fast as possible.
+    def set_speed(self, speed):
+        self.speed=speed
+
+    #returns the wall-clock duration of a tick, or None if the loop must not sleep at all.
+    #Before the game starts the loop is paced in real time anyway, to avoid spinning while waiting for players.
+    def get_tick_period(self):
+        if self.speed is None:
+            if self.game.game_started:
+                return None
+            return self.dt
+        return self.dt/self.speed
 
     def update_gui(self):
         if not self.has_gui:
             return
-        keys=p.getKeyboardEvents()
+        keys=p.getKeyboardEvents(physicsClientId=self.client)
         if self.pressed(keys, p.B3G_LEFT_ARROW):
-            self.camera_angle -= DT*25.0
+            self.camera_angle -= self.dt*25.0
         if self.pressed(keys, p.B3G_RIGHT_ARROW):
-            self.camera_angle += DT*25.0
+            self.camera_angle += self.dt*25.0
         if self.pressed(keys, p.B3G_UP_ARROW):
             self.camera_distance=max(1.5, self.camera_distance
-                                     -DT*0.5)
+                                     -self.dt*0.5)
         if self.pressed(keys, p.B3G_DOWN_ARROW):
             self.camera_distance=min(5.0, self.camera_distance
-                                     +DT*0.5)
+                                     +self.dt*0.5)
         if self.pressed(keys, ord(' ')):
             self.camera_angle=INITIAL_CAMERA_ANGLE
             self.camera_distance=INITIAL_CAMERA_DISTANCE
@@ -146,7 +308,8 @@ class Playfield:
                 cameraDistance=self.camera_distance,
                 cameraYaw=self.camera_angle,
                 cameraPitch=-30.0,
-                cameraTargetPosition=[0.0, 0.0, 1.0])
+                cameraTargetPosition=[0.0, 0.0, 1.0],
+                physicsClientId=self.client)
 
     def pressed(self, keys, k):
         return keys.get(k, 0) & p.KEY_IS_DOWN
@@ -154,40 +317,31 @@ class Playfield:
     def update_ball(self):
         if self.ball_held_position:
             p.resetBasePositionAndOrientation(self.ball,
-                    self.ball_held_position, [1.0,0.0,0.0,0.0])
-        po=p.getBasePositionAndOrientation(self.ball)
-        pos=po[0]
+                    self.ball_held_position, [1.0,0.0,0.0,0.0],
+                    physicsClientId=self.client)
+        snap=self.snapshot
+        snap.capture()
+        pos=snap.ball_position
         self.ball_position=pos
         dist=math.hypot(pos[0], pos[1])
         self.ball_away=(dist>DIST_THRESHOLD)
-        bv=p.getBaseVelocity(self.ball)
-        v=bv[0]
+        v=snap.ball_velocity
         self.ball_velocity=v
         self.ball_speed=math.hypot(v[0], v[1], v[2])
         if self.ball_speed > STOPPED_SPEED_THRESHOLD:
             self.stopped_time=0.0
         else:
-            self.stopped_time+=DT
+            self.stopped_time+=self.dt
         self.ball_stopped=(self.stopped_time>STOPPED_TIME_THRESHOLD)
-        cpoints=self.cpoints
-        self.cpoints=[]
-        self.contact_floor=False
-        self.contact_table=False
-        self.contact_robot=[False, False]
-        for cp in cpoints:
-            if cp[1]!=self.ball:
-                continue
-            elif cp[2]==self.table and cp[4]==-1:
-                self.contact_table=True
-            elif cp[2]==self.floor:
-                self.contact_floor=True
-            elif cp[2]==self.robot[0] and cp[4]>1:
-                self.contact_robot[0]=True
-            elif cp[2]==self.robot[1] and cp[4]>1:
-                self.contact_robot[1]=True
-            elif cp[2] in self.robot:
-                # cp[4]<=1 
-                self.contact_floor=True
+        mask=self.contact_mask
+        self.contact_floor=bool(mask & CONTACT_FLOOR)
+        self.contact_table=bool(mask & CONTACT_TABLE)
+        self.contact_robot=[bool(mask & CONTACT_ROBOT[0]), bool(mask & CONTACT_ROBOT[1])]
+        self.last_contact_mask=mask
+        if mask:
+            self.contact_substep, self.last_contact_substep=self.last_contact_substep, self.contact_substep
+        self.last_contact_tick_time=self.sim_time
+        self.contact_mask=0
 
     def set_update_state_callback(self, update_cb, next_cb=None, 
                             duration=NO_DEADLINE):
@@ -198,17 +352,28 @@ class Playfield:
     #initializes the connection with PyBullet, configuring the display and setting the severity and simulation step.
     def init_pybullet(self):
         if not self.has_gui:
-            p.connect(p.DIRECT)
+            self.client=p.connect(p.DIRECT)
         else:
-            p.connect(p.GUI)
-            p.configureDebugVisualizer(p.COV_ENABLE_GUI, 0)
-            p.configureDebugVisualizer(p.COV_ENABLE_MOUSE_PICKING, 0)
-            p.configureDebugVisualizer(p.COV_ENABLE_KEYBOARD_SHORTCUTS, 0)
-        p.setGravity(0,0,-9.81)
-        p.setTimeStep(0.5*DT)
-        p.setAdditionalSearchPath(pd.getDataPath())
+            self.client=p.connect(p.GUI)
+            p.configureDebugVisualizer(p.COV_ENABLE_GUI, 0, physicsClientId=self.client)
+            p.configureDebugVisualizer(p.COV_ENABLE_MOUSE_PICKING, 0, physicsClientId=self.client)
+            p.configureDebugVisualizer(p.COV_ENABLE_KEYBOARD_SHORTCUTS, 0, physicsClientId=self.client)
+        p.setGravity(0,0,-9.81, physicsClientId=self.client)
+        p.setTimeStep(self.dt/self.substeps, physicsClientId=self.client)
+        prof=SIM_PROFILES[self.profile]
+        p.setPhysicsEngineParameter(numSolverIterations=prof['solver_iterations'], physicsClientId=self.client)
+        if prof['contact_erp'] is not None:
+            p.setPhysicsEngineParameter(contactERP=prof['contact_erp'], physicsClientId=self.client)
+        p.setAdditionalSearchPath(pd.getDataPath(), physicsClientId=self.client)
 
     def schedule_start_positions(self, after_cb=None):
+        if self.idle_fast and self.speed is None:
+            #fast-forward: the robots are put in the start position at once.
+            jp=get_neutral_joint_position()
+            for index in [0, 1]:
+                self.reset_robot_joints(index, jp)
+            self.set_update_state_callback(self.start_pos2, after_cb, 0.0)
+            return
         def next_cb1():
             self.set_update_state_callback(self.start_pos2,
                                            after_cb, 0.9)
@@ -230,33 +395,24 @@ class Playfield:
     def quit(self):
         self.finished=True
 
-    def get_robot_joints(self, index):
-        jp=[0.0]*JOINTS
-        rob=self.robot[index]
-        for j in range(JOINTS):
-            jp[j] = p.getJointState(rob, j)[0]
-        return jp
+    #puts the robots in the neutral position and the ball above the table for a new match, keeping the bodies.
+    def reset_world(self):
+        self.update_state_cb=None
+        self.next_state_cb=None
+        jp=get_neutral_joint_position()
+        for index in [0, 1]:
+            self.reset_robot_joints(index, jp)
+        p.resetBaseVelocity(self.ball, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0], physicsClientId=self.client)
+        self.hold_ball([0, 0, 2.0])
 
     def set_robot_joints(self, index, values):
-        rob=self.robot[index]
-        for j,val in enumerate(values):
-            p.setJointMotorControl2(rob, j, 
+        n=len(values)
+        self.motor_targets[index][:n]=values
+        p.setJointMotorControlArray(self.robot[index], JOINT_INDICES[:n],
                                     p.POSITION_CONTROL,
-                                    val,
-                                    force=JOINT_FORCE)
-
-    def get_paddle_position_and_normal(self, index):
-        rob=self.robot[index]
-        pos=[0.0]*3
-        nor=[0.0]*3
-        ls=p.getLinkState(rob, JOINTS) 
-        pos[0:3]=ls[0][0:3]
-        quat=ls[1]
-        mat=p.getMatrixFromQuaternion(quat)
-        nor[0]=mat[2]
-        nor[1]=mat[5]
-        nor[2]=mat[8]
-        return pos,nor
+                                    targetPositions=values,
+                                    forces=JOINT_FORCES[:n],
+                                    physicsClientId=self.client)
 
 
     def set_text(self, index, added=None):
@@ -274,7 +430,8 @@ class Playfield:
             z+=0.5
         p.addUserDebugText(text, [0.0, pos, z],
                            textSize=FONT_SIZE, 
-                           replaceItemUniqueId=self.text[index])
+                           replaceItemUniqueId=self.text[index],
+                           physicsClientId=self.client)
 
     def set_central_text(self, text):
         self.set_text(2, text)
@@ -283,14 +440,55 @@ class Playfield:
         self.name[index]=name
         self.set_text(index)
 
+    #restores a physics state saved with saveBullet and the motor targets that went with it; the ball and contact
+    #information is refreshed at once, so the game does not see the situation before the restore in this tick.
+    def restore_state(self, path, motor_targets):
+        p.restoreState(fileName=path, physicsClientId=self.client)
+        for index in [0, 1]:
+            self.set_robot_joints(index, motor_targets[index])
+        self.ball_held_position=None
+        self.update_state_cb=None
+        self.next_state_cb=None
+        self.stopped_time=0.0
+        self.ball_stopped=False
+        self.ball_away=False
+        self.contact_mask=0
+        self.contact_floor=False
+        self.contact_table=False
+        self.contact_robot=[False, False]
+        self.snapshot.capture()
+        self.ball_position=self.snapshot.ball_position
+        self.ball_velocity=self.snapshot.ball_velocity
+
+    #puts a robot in the given joint position at once, at rest, with the motors holding it there.
+    def reset_robot_joints(self, index, values):
+        p.resetJointStatesMultiDof(self.robot[index], JOINT_INDICES,
+                                   [[v] for v in values],
+                                   physicsClientId=self.client)
+        self.set_robot_joints(index, values)
+        self.snapshot.capture()
+
+    #moves the robots and the ball to the given joints and position without simulating, e.g. to show a recorded tick.
+    def teleport(self, joints, ball_position):
+        for index in [0, 1]:
+            p.resetJointStatesMultiDof(self.robot[index], JOINT_INDICES,
+                                       [[v] for v in joints[index]],
+                                       physicsClientId=self.client)
+        p.resetBasePositionAndOrientation(self.ball, ball_position, [0.0, 0.0, 0.0, 1.0],
+                                          physicsClientId=self.client)
+
     def hold_ball(self, pos):
         self.ball_held_position=pos
 
-    def throw_ball(self, velocity):
+    def throw_ball(self, velocity, angular_velocity=None):
         self.ball_held_position=None
         self.ball_stopped=False
         self.stopped_time=0.0
-        p.resetBaseVelocity(self.ball, velocity)
+        if angular_velocity is None:
+            p.resetBaseVelocity(self.ball, velocity, physicsClientId=self.client)
+        else:
+            p.resetBaseVelocity(self.ball, velocity, angular_velocity,
+                                physicsClientId=self.client)
 
     def get_player_origin(self, index):
         y=index*2.0-1
@@ -301,6 +499,251 @@ class Playfield:
 
 
 
+#Writes the states of both players in a preallocated array. Positions and vectors of the world are 
+#converted to the frame of each player all at once: player 2 sees the field rotated by 180 degrees.
+class StateBuilder:
+    def __init__(self):
+        self.states=np.zeros((2, STATE_WIRE_DIMENSION), dtype=STATE_FLOAT)
+        self.points=np.zeros((3, 3)) #paddle 1, paddle 2 and ball positions
+        self.vectors=np.zeros((3, 3)) #paddle 1 normal, paddle 2 normal and ball velocity
+        self.player_points=np.zeros((2, 3, 3))
+        self.player_vectors=np.zeros((2, 3, 3))
+
+    def build(self, snap):
+        pts=self.points
+        vec=self.vectors
+        pts[0]=snap.paddle[0][0]
+        pts[1]=snap.paddle[1][0]
+        pts[2]=snap.ball_position
+        vec[0]=snap.paddle[0][1]
+        vec[1]=snap.paddle[1][1]
+        vec[2]=snap.ball_velocity
+        ppts=self.player_points
+        pvec=self.player_vectors
+        np.subtract(pts, PLAYER_ORIGINS[:, None, :], out=ppts)
+        np.multiply(ppts, PLAYER_MIRRORS[:, None, :], out=ppts)
+        np.multiply(vec, PLAYER_MIRRORS[:, None, :], out=pvec)
+        st=self.states
+        for index in [0, 1]:
+            st[index, 0:JOINTS]=snap.joints[index]
+            st[index, 11:14]=ppts[index, index]
+            normal=pvec[index, index]
+            if normal[1]<0.0: #the paddle normal always points towards the opponent
+                np.negative(normal, out=st[index, 14:17])
+            else:
+                st[index, 14:17]=normal
+            st[index, 17:20]=ppts[index, 2]
+            st[index, 20:23]=pvec[index, 2]
+            st[index, 23:26]=ppts[index, 1-index]
+        return st
+
+#Reads the state of the ball and of the robots once per tick with batched pybullet calls;
+#the playfield, the game and the players all use these values instead of querying pybullet again.
+class PhysicsSnapshot:
+    def __init__(self, playfield):
+        self.playfield=playfield
+        self.joints=[[0.0]*JOINTS, [0.0]*JOINTS]
+        self.paddle=[([0.0]*3, [0.0]*3), ([0.0]*3, [0.0]*3)]
+        self.ball_position=(0.0, 0.0, 0.0)
+        self.ball_velocity=(0.0, 0.0, 0.0)
+
+    def capture(self):
+        pf=self.playfield
+        cid=pf.client
+        for index in [0, 1]:
+            rob=pf.robot[index]
+            js=p.getJointStates(rob, JOINT_INDICES, physicsClientId=cid)
+            self.joints[index]=[s[0] for s in js]
+            ls=p.getLinkState(rob, JOINTS, physicsClientId=cid)
+            self.paddle[index]=(list(ls[0]), get_quaternion_z_axis(ls[1]))
+        self.ball_position=p.getBasePositionAndOrientation(pf.ball,
+                                physicsClientId=cid)[0]
+        self.ball_velocity=p.getBaseVelocity(pf.ball, physicsClientId=cid)[0]
+
+#third column of the rotation matrix of a quaternion (x,y,z,w), i.e. the rotated z axis.
+def get_quaternion_z_axis(quat):
+    x, y, z, w=quat
+    return [2.0*(x*z+w*y), 2.0*(y*z-w*x), 1.0-2.0*(x*x+y*y)]
+
+#Steps several playfields round-robin in the calling thread, each one paced by its own speed.
+#pybullet keeps the GIL while stepping, so interleaving the worlds is as fast as using worker threads.
+def run_playfields(playfields, matchmaker=None):
+    active=list(playfields)
+    for pf in active:
+        pf.next_tick_time=pf.due_time=time.time()
+    try:
+        while active or matchmaker:
+            if matchmaker:
+                for pf in matchmaker.update():
+                    pf.next_tick_time=pf.due_time=time.time()
+                    active.append(pf)
+            now=time.time()
+            for pf in active:
+                if pf.next_tick_time>now:
+                    continue
+                pf.step()
+                period=pf.get_tick_period()
+                now=time.time()
+                if period is None:
+                    pf.next_tick_time=pf.due_time=now
+                    continue
+                #due_time is when the next tick is due in real time, next_tick_time when it is actually played.
+                due=pf.due_time+period
+                lag=now-due
+                if lag<=0.0:
+                    pf.next_tick_time=due
+                else:
+                    fraction=CATCHUP_POLICIES[pf.catchup]
+                    dropped=0.0
+                    if fraction is None or lag>CATCHUP_LIMIT:
+                        dropped=lag
+                        pf.drift+=lag
+                        due=now
+                        pf.next_tick_time=now
+                    else:
+                        pf.next_tick_time=now+period*fraction
+                    if pf.profiler:
+                        pf.profiler.count_missed_deadline(lag, dropped)
+                pf.due_time=due
+            for pf in [pf for pf in active if pf.finished]:
+                active.remove(pf)
+                if matchmaker and matchmaker.park(pf):
+                    continue
+                pf.close()
+            if active:
+                dt=min(pf.next_tick_time for pf in active)-time.time()
+                if dt>0.0:
+                    time.sleep(dt)
+            elif matchmaker:
+                time.sleep(MATCHMAKER_POLL_TIME)
+    finally:
+        for pf in active:
+            pf.close()
+        if matchmaker:
+            matchmaker.close()
+
+
+#Pairs the players connecting to a single port and plays every pair in a headless world of its own: a world whose
+#match is over goes back to a pool and is reset in place for the next pair, instead of loading a new one.
+#The players given with -auto/-dummy are added to every world, so that fewer remote players make a match.
+class Matchmaker:
+    def __init__(self, opt):
+        self.opt=opt
+        self.dispatcher=GameDispatcher(opt.port)
+        self.needed=opt.game().players_needed-len(opt.players)
+        self.pool=[]
+        self.worlds=0
+        self.matches=0
+
+    #starts a match for every group of waiting players; returns the worlds to be stepped from now on.
+    def update(self):
+        started=[]
+        while True:
+            with self.dispatcher.lock:
+                if len(self.dispatcher.lobby)<self.needed:
+                    break
+                items=self.dispatcher.lobby[:self.needed]
+                del self.dispatcher.lobby[:self.needed]
+            if self.pool:
+                pf=self.pool.pop()
+            else:
+                self.worlds+=1
+                pf=create_match(self.opt, self.opt.port+self.worlds, False, False)
+                pf.game.pooled=True
+            self.matches+=1
+            print('=== Match %d:' % self.matches, ' vs '.join(name for name, _ in items), '===')
+            for name, channel in items:
+                pf.game.add_remote_player(channel, name)
+            started.append(pf)
+        return started
+
+    #keeps a world whose match is over for the next pair; False if the world must be closed.
+    def park(self, pf):
+        if not pf.game.pooled or len(self.pool)>=MATCHMAKER_POOL_LIMIT:
+            return False
+        pf.finished=False
+        self.pool.append(pf)
+        return True
+
+    def close(self):
+        for pf in self.pool:
+            pf.close()
+        self.pool=[]
+        self.dispatcher.shutdown()
+
+#the policy player needs torch, which is imported only when the player is created.
+def policy_player_factory(models_dir):
+    def create():
+        import policy_player
+        return policy_player.PolicyPlayerInterface(models_dir)
+    return create
+
+#a value of a drill configuration: either fixed or a [min, max] range.
+def sample_range(r, rng=random):
+    if isinstance(r, (list, tuple)):
+        return rng.uniform(r[0], r[1])
+    return r
+
+#the bounds of a drill value, raising ValueError if it is not a number or a [min, max] range.
+def range_bounds(r, path):
+    if isinstance(r, (list, tuple)):
+        if len(r)!=2:
+            raise ValueError('%s must be a number or a [min, max] range' % path)
+        lo, hi=r
+    else:
+        lo=hi=r
+    for v in (lo, hi):
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v):
+            raise ValueError('%s must be a number or a [min, max] range' % path)
+    if lo>hi:
+        raise ValueError('%s has its min greater than its max' % path)
+    return lo, hi
+
+#merges a configuration in its defaults; the nested sections are merged field by field.
+def merge_config(default, config, path):
+    if not isinstance(config, dict):
+        raise ValueError('%s must be an object' % path)
+    merged=dict(default)
+    for k, v in config.items():
+        if k not in default:
+            raise ValueError('unknown field %s.%s' % (path, k))
+        if isinstance(default[k], dict):
+            v=merge_config(default[k], v, path+'.'+k)
+        merged[k]=v
+    return merged
+
+#the drill with the missing fields taking the default values; raises ValueError if it cannot be served.
+def check_drill(drill):
+    drill=merge_config(DRILL_DEFAULT, drill, 'drill')
+    shots=drill['shots']
+    if not isinstance(shots, list) or not shots:
+        raise ValueError('drill.shots must be a non-empty list')
+    drill['shots']=shots=[merge_config(DRILL_SHOT_DEFAULT, shot, 'drill.shots[%d]' % k) for k, shot in enumerate(shots)]
+    interval=drill['interval']
+    if isinstance(interval, (list, tuple)) or range_bounds(interval, 'drill.interval')[0]<0.0:
+        raise ValueError('drill.interval must be a number not lower than 0')
+    for k, shot in enumerate(shots):
+        path='drill.shots[%d]' % k
+        weight=shot['weight']
+        if isinstance(weight, (list, tuple)) or range_bounds(weight, path+'.weight')[0]<0.0:
+            raise ValueError('%s.weight must be a number not lower than 0' % path)
+        if range_bounds(shot['speed'], path+'.speed')[0]<=0.0:
+            raise ValueError('%s.speed must be greater than 0' % path)
+        for section in ['position', 'target', 'spin']:
+            for axis, r in shot[section].items():
+                range_bounds(r, '%s.%s.%s' % (path, section, axis))
+        #the horizontal distance sets the flight time: it must not be able to be 0.
+        overlap=True
+        for axis in ['x', 'y']:
+            plo, phi=range_bounds(shot['position'][axis], path)
+            tlo, thi=range_bounds(shot['target'][axis], path)
+            overlap=overlap and plo<=thi and tlo<=phi
+        if overlap:
+            raise ValueError('%s.target can be right below its position' % path)
+    if sum(shot['weight'] for shot in shots)<=0.0:
+        raise ValueError('drill.shots need a weight greater than 0')
+    return drill
+
 def get_neutral_joint_position():
         jp=[0.0]*JOINTS
         jp[0]=-0.3
@@ -339,10 +782,63 @@ class GameDispatcher(channel.Dispatcher):
             return item
 
 
+#Read-only observers on a port of their own: they never enter the lobby. The game publishes one frame (the wire
+#states of both players) per spectator tick and a broadcast thread fans it out, so the tick costs the same whatever
+#the number of spectators. A slow spectator only fills its own bounded outbound queue, where old frames are dropped.
+class SpectatorDispatcher(channel.Dispatcher):
+    def __init__(self, port):
+        self.frame=None
+        self.frame_ready=threading.Event()
+        self.spectators=0
+        self.keys=dict() #transient channel -> key of its server channel
+        super().__init__(port)
+        t=threading.Thread(target=self.broadcast_thread)
+        t.start()
+
+    #every connection gets its own key, whatever its hello message.
+    def register_channel(self, transient_channel, hello_message):
+        with self.lock:
+            self.spectators+=1
+            key=self.spectators
+            self.keys[transient_channel]=key
+        super().register_channel(transient_channel, key)
+
+    #a spectator does not reconnect: its server channel is closed together with the connection.
+    def close_channel(self, channel):
+        super().close_channel(channel)
+        with self.lock:
+            key=self.keys.pop(channel, None)
+            sc=self.server_channels.get(key) if key is not None else None
+        if sc:
+            sc.close()
+
+    def has_spectators(self):
+        return len(self.server_channels)>0
+
+    def publish(self, frame):
+        self.frame=frame
+        self.frame_ready.set()
+
+    def broadcast_thread(self):
+        while not self.is_finished():
+            if not self.frame_ready.wait(channel.WAIT_TIME):
+                continue
+            self.frame_ready.clear()
+            frame=self.frame
+            with self.lock:
+                channels=list(self.server_channels.values())
+            for ch in channels:
+                ch.send(frame)
+
+
 class Game:
     def __init__(self):
         self.dispatcher=None
+        self.spectators=None
+        self.spectator_interval=1
+        self.spectator_countdown=0
         self.num_players=0
+        self.players_needed=2
         self.player=[None, None]
         self.player_name=[None, None]
         self.player_active=[False, False]
@@ -360,6 +856,22 @@ class Game:
         self.reason=None
         self.score_limit=None
         self.time_limit=None
+        self.tick=0
+        self.lockstep_deadline=None
+        self.lockstep_fallback='hold'
+        self.state_builder=StateBuilder()
+        self.recorder=None
+        self.events=0
+        self.capture_library=None
+        self.last_ball_y=0.0
+        self.rollouts=0
+        self.idle_ticks=0
+        self.matches=1
+        self.match_count=1
+        self.keep_players=True
+        self.pooled=False
+        self.first_serving_player=0
+        self.rng=random
 
     def set_playfield(self, playfield):
         self.playfield=playfield
@@ -370,9 +882,38 @@ class Game:
     def set_time_limit(self, limit):
         self.time_limit=limit
 
+    #the generator of the random choices of the game (services, drill shots, snapshots), the random module by default.
+    def set_rng(self, rng):
+        self.rng=rng
+
+    #enables the lockstep protocol: every tick waits up to deadline seconds for the joints of the remote players.
+    def set_lockstep(self, deadline, fallback='hold'):
+        self.lockstep_deadline=deadline
+        self.lockstep_fallback=fallback
+
+    #records every tick of the game to a trace file (see tracefile.py).
+    def enable_recording(self, path):
+        pf=self.playfield
+        self.recorder=tracefile.TraceRecorder(path, STATE_WIRE_DIMENSION, JOINTS, pf.dt, pf.substeps)
+
+    #saves a physics snapshot in the library every time the ball crosses the net during a rally.
+    def enable_capture(self, library):
+        self.capture_library=library
+
+    #plays matches in a row (0 for no limit) in the same world. With keep_players the same players play all of them,
+    #otherwise the remote players are dismissed after every match and the next ones are taken from the lobby.
+    def set_repeat(self, matches, keep_players=True):
+        self.matches=matches
+        self.keep_players=keep_players
+
     def enable_dispatcher(self, port=DEFAULT_PORT):
         self.dispatcher=GameDispatcher(port)
 
+    #accepts spectators on port, sending them about rate frames per second.
+    def enable_spectators(self, port, rate=SPECTATOR_RATE):
+        self.spectators=SpectatorDispatcher(port)
+        self.spectator_interval=max(1, int(round(1.0/(self.playfield.dt*rate))))
+
     def swap_serving_player(self):
         self.serving_player=1-self.serving_player
 
@@ -385,80 +926,215 @@ class Game:
 
     def update(self):
         pf=self.playfield
+        prof=pf.profiler
         self.update_schedule()
         if self.dispatcher:
             self.update_dispatcher()
         self.update_play()
-        self.prepare_state()
+        if prof:
+            prof.mark(profiler.PHASE_RULES)
+        post=self.should_post_state()
+        publish=self.should_publish_state()
+        if post or publish or self.recorder:
+            self.prepare_state()
+        if self.lockstep_deadline:
+            self.tick=self.tick%LOCKSTEP_TICK_LIMIT+1
+        if prof:
+            prof.mark(profiler.PHASE_STATE)
+        #the states are posted to both players before waiting for any answer, so that remote players think in parallel.
         for index in [0, 1]:
-            if self.player[index]:
+            if self.player[index] and post:
                 s=self.compute_state(index)
-                jp=self.player[index].update(s)
+                self.player[index].post_state(s)
+            elif self.player[index]:
+                self.player[index].skip_state(pf.dt)
+        if publish:
+            self.spectators.publish(self.state_builder.states.astype(WIRE_FLOAT).tobytes())
+        if prof:
+            prof.mark(profiler.PHASE_SEND)
+        joints=[None, None]
+        for index in [0, 1]:
+            if self.player[index] and post:
+                jp=self.player[index].get_joints()
+                joints[index]=jp
+                if prof:
+                    prof.mark(profiler.PHASE_RECEIVE)
                 if self.player_active[index]:
                     pf.set_robot_joints(index, jp)
+                    if prof:
+                        prof.mark(profiler.PHASE_JOINTS)
+        if self.recorder:
+            active=self.player_active[0]+2*self.player_active[1]
+            self.recorder.record(pf.sim_time, self.state_builder.states, joints,
+                                 pf.last_contact_mask, self.events, active)
+            self.events=0
+        if self.capture_library is not None:
+            self.update_capture()
+        if prof:
+            prof.mark(profiler.PHASE_RECORD)
         if self.game_started:
             t=int(self.game_time)
             ss=t%60
             mm=t//60
             msg='%02d:%02d' % (mm, ss)
             pf.set_text(2, msg)
-            self.game_time += DT
+            self.game_time += pf.dt
+
+    #Evaluates candidate joint commands for a player: for each one the world is saved, the candidate is held for up to
+    #horizon seconds of headless simulation (the opponent keeps its current targets) until the point is decided, then
+    #the world is restored. Returns one (outcome, ticks, landed, x, y, z) tuple per candidate: outcome is +1 if the
+    #player wins the point, -1 if it loses it, 0 if the rally is void or still open; the first contact of the ball
+    #with the opponent side of the table, if any, is in the coordinates of the player.
+    def rollout(self, index, candidates, horizon):
+        pf=self.playfield
+        cid=pf.client
+        ticks_limit=int(min(horizon, ROLLOUT_MAX_HORIZON)/pf.dt)
+        state_id=p.saveState(physicsClientId=cid)
+        saved=self.save_rollout_fields()
+        results=[]
+        for jp in candidates:
+            self.restore_rollout_fields(saved)
+            p.restoreState(stateId=state_id, physicsClientId=cid)
+            pf.set_robot_joints(index, jp)
+            ticks=0
+            landing=None
+            dy=pf.get_player_direction_y(index)
+            while ticks<ticks_limit and not self.waiting:
+                for k in range(pf.substeps):
+                    p.stepSimulation(physicsClientId=cid)
+                    pf.collect_contacts(k)
+                pf.update_ball()
+                self.update_play()
+                ticks+=1
+                if landing is None and pf.contact_table and pf.ball_position[1]*dy>0.0:
+                    landing=self.convert_coordinates(index, pf.ball_position)
+            outcome=0
+            if self.waiting and self.reason is None and self.concerned_player>=0:
+                outcome=1 if self.concerned_player!=index else -1
+            if landing is None:
+                results.append((outcome, ticks, 0, 0.0, 0.0, 0.0))
+            else:
+                results.append((outcome, ticks, 1)+tuple(landing))
+        self.restore_rollout_fields(saved)
+        p.restoreState(stateId=state_id, physicsClientId=cid)
+        p.removeState(state_id, physicsClientId=cid)
+        pf.snapshot.capture()
+        self.rollouts+=len(candidates)
+        return results
+
+    #the game and playfield fields changed by update_play and update_ball; pybullet does not save the motor targets.
+    def save_rollout_fields(self):
+        pf=self.playfield
+        return ({k: getattr(self, k) for k in ['waiting', 'waiting_service', 'concerned_player', 'field_touch',
+                                               'robot_touch', 'reason']},
+                {k: getattr(pf, k) for k in ['ball_held_position', 'stopped_time', 'ball_stopped', 'ball_away',
+                                             'ball_position', 'ball_velocity', 'ball_speed', 'contact_floor',
+                                             'contact_table', 'last_contact_mask', 'last_contact_tick_time']},
+                list(self.sched_queue),
+                list(pf.contact_robot),
+                list(pf.last_contact_substep),
+                [list(t) for t in pf.motor_targets])
+
+    def restore_rollout_fields(self, saved):
+        pf=self.playfield
+        game_fields, pf_fields, sched_queue, contact_robot, contact_substep, motor_targets=saved
+        for k, v in game_fields.items():
+            setattr(self, k, v)
+        for k, v in pf_fields.items():
+            setattr(pf, k, v)
+        self.sched_queue=list(sched_queue)
+        pf.contact_robot=list(contact_robot)
+        pf.last_contact_substep=list(contact_substep)
+        pf.contact_mask=0
+        for index in [0, 1]:
+            pf.set_robot_joints(index, motor_targets[index])
+
+    #the snapshot is taken after the joints of this tick have been applied, so that restoring it resumes the rally
+    #exactly; toward is the player that has to return the ball.
+    def update_capture(self):
+        pf=self.playfield
+        y=pf.ball_position[1]
+        prev=self.last_ball_y
+        self.last_ball_y=y
+        if self.waiting or self.waiting_service or prev*y>0.0 or y==prev:
+            return
+        info={'toward': 0 if y<prev else 1,
+              'serving_player': self.serving_player,
+              'concerned_player': self.concerned_player,
+              'field_touch': self.field_touch,
+              'robot_touch': self.robot_touch,
+              'player_active': self.player_active}
+        self.capture_library.capture(pf, info)
+        if self.capture_library.is_full():
+            print('--- Warning: snapshot library full, capture stopped ---')
+            self.capture_library=None
 
     def update_dispatcher(self):
-        if self.num_players==2:
+        if self.num_players==self.players_needed:
             return
         item=self.dispatcher.get_next()
         if not item:
             return
         name, channel=item
+        self.add_remote_player(channel, name)
+
+    #adds a player connected through a channel of the dispatcher (of this game or of the matchmaker).
+    def add_remote_player(self, channel, name):
         player=RemotePlayerInterface(channel, name)
+        if self.lockstep_deadline:
+            player.set_lockstep(self.lockstep_deadline, 
+                                self.lockstep_fallback)
+        player.set_rollout_handler(self.rollout, self.num_players)
         self.add_player(player, name)
 
+    #while the playfield is idle (see Playfield.step) the players get a state only every few ticks, except in lockstep
+    #mode, where every state must be answered.
+    def should_post_state(self):
+        if not self.playfield.idle or self.lockstep_deadline:
+            self.idle_ticks=0
+            return True
+        self.idle_ticks+=1
+        return self.idle_ticks%IDLE_STATE_INTERVAL==1
+
+    #the spectators get a frame every spectator_interval ticks, IDLE_STATE_INTERVAL times less often while the
+    #playfield is idle; the next frame after an idle phase comes at the normal interval.
+    def should_publish_state(self):
+        if not self.spectators:
+            return False
+        interval=self.spectator_interval
+        if self.playfield.idle:
+            interval*=IDLE_STATE_INTERVAL
+        self.spectator_countdown=min(self.spectator_countdown, interval)-1
+        if self.spectator_countdown>0:
+            return False
+        self.spectator_countdown=interval
+        return self.spectators.has_spectators()
+
+    #builds the states of both players for this tick; the geometric part comes from the physics snapshot.
     def prepare_state(self):
         pf=self.playfield
-        self.joints=[pf.get_robot_joints(0), 
-                     pf.get_robot_joints(1)]
-        self.paddle=[pf.get_paddle_position_and_normal(0),
-                      pf.get_paddle_position_and_normal(1)]
-        x,y,z=self.paddle[1][0]
-        dx,dy,dz=self.paddle[1][1]
-        tx=x+0.6*dx
-        ty=y+0.6*dy
-        tz=z+0.6*dz
-
-
-
+        states=self.state_builder.build(pf.snapshot)
+        tick=self.tick if self.lockstep_deadline else 0
+        playing=int(not self.waiting and not self.waiting_service)
+        for index in [0, 1]:
+            y_dir=2*index-1
+            oserve=self.waiting_service and self.serving_player!=index
+            waiting=self.waiting or (self.waiting_service and not oserve)
+            in_field=int(pf.ball_position[1]*y_dir > 0.0)
+            if self.concerned_player==index:
+                touches=(int(self.field_touch), int(self.robot_touch), 0)
+            else:
+                touches=(0, 0, int(self.field_touch))
+            states[index, 26:37]=(int(waiting), int(oserve), playing,
+                    in_field, touches[0], touches[1], 1-in_field, touches[2],
+                    self.score[index], self.score[1-index], self.game_time)
+            states[index, STATE_TICK_INDEX]=tick
+            states[index, STATE_PERIOD_INDEX]=pf.dt
+            states[index, STATE_SUBSTEPS_INDEX]=pf.substeps
+
+    #returns the state of a player as a row of the state builder: it is overwritten at the next tick.
     def compute_state(self, index):
-        pf=self.playfield
-        y_dir=2*index-1
-        state=[0.0]*STATE_DIMENSION
-        state[0:10]=self.joints[index]
-        pad=self.paddle[index]
-        state[11:14]=self.convert_coordinates(index, pad[0])
-        state[14:17]=self.convert_vector(index, pad[1], +1)
-        state[17:20]=self.convert_coordinates(index, pf.ball_position)
-        state[20:23]=self.convert_vector(index, pf.ball_velocity)
-        opad=self.paddle[1-index]
-        state[23:26]=self.convert_coordinates(index, opad[0])
-        oserve=self.waiting_service and self.serving_player!=index
-        waiting=self.waiting or (self.waiting_service and not oserve)
-        state[26]=int(waiting)
-        state[27]=int(oserve)
-        state[28]=int(not self.waiting and not self.waiting_service)
-        state[29]=int(pf.ball_position[1]*y_dir > 0.0)
-        if self.concerned_player==index:
-            state[30]=int(self.field_touch)
-            state[31]=int(self.robot_touch)
-            state[33]=0
-        else:
-            state[30]=0
-            state[31]=0
-            state[33]=int(self.field_touch)
-        state[32]=1-state[29]
-        state[34]=self.score[index]
-        state[35]=self.score[1-index]
-        state[36]=self.game_time
-        return state
+        return self.state_builder.states[index]
 
     def convert_coordinates(self, index, vec):
         orig=self.playfield.get_player_origin(index)
@@ -467,29 +1143,22 @@ class Game:
         else:
             return orig[0]-vec[0], orig[1]-vec[1], vec[2]-orig[2]
 
-    def convert_vector(self, index, vec, desired_y_sign=None):
-        x, y, z=vec
-        if index==1:
-            x=-x
-            y=-y
-        if desired_y_sign:
-            if y*desired_y_sign<0.0:
-                x=-x
-                y=-y
-                z=-z
-        return x,y,z
-
     def on_quit(self):
         for p in self.player:
             if p is not None:
                 p.on_quit()
         if self.dispatcher:
             self.dispatcher.shutdown()
+        if self.spectators:
+            self.spectators.shutdown()
+        if self.recorder:
+            self.recorder.set_names(self.player_name)
+            self.recorder.close()
 
     def add_player(self, player, name):
         print('=== Adding player:', name,' ===')
         np=self.num_players
-        if np>=2:
+        if np>=self.players_needed:
             self.playfield.quit()
             print('*** TOO MANY PLAYERS ***')
             return
@@ -498,7 +1167,7 @@ class Game:
         self.player[np]=player
         self.player_name[np]=name
         pf.set_name(np, name)
-        if np==1:
+        if np==self.players_needed-1:
             pf.set_central_text("")
             self.schedule(self.on_ready)
 
@@ -508,7 +1177,7 @@ class Game:
             callback=self.sched_queue[0][1]
             del self.sched_queue[0]
             callback()
-        self.sched_time += DT
+        self.sched_time += self.playfield.dt
 
     def schedule(self, callback, delay=0.0):
         t=self.sched_time + delay
@@ -521,20 +1190,24 @@ class Game:
     def get_service_position(self, index):
         pf=self.playfield
         pos=pf.get_player_origin(index)
-        pos[0]+=random.uniform(-0.1, 0.1)
+        pos[0]+=self.rng.uniform(-0.1, 0.1)
         pos[2]=BALL_SERVICE_HEIGHT
         return pos
 
+    #random wait between the start positions and the service.
+    def get_serve_delay(self):
+        return self.rng.uniform(0.5, 1.0)
+
     def get_service_velocity(self, index):
         pf=self.playfield
         dy=pf.get_player_direction_y(index)
         x0, y0, z0=pf.ball_position
-        dl=abs(y0)+0.25*TABLE_LENGTH+random.uniform(-0.1, 0.3)
+        dl=abs(y0)+0.25*TABLE_LENGTH+self.rng.uniform(-0.1, 0.3)
         dh=z0-TABLE_HEIGHT
         g=9.81
         v=dl*math.sqrt(g/(2*(dh+dl)))
         vz=v
-        vx=random.uniform(-0.2*v, 0.2*v)
+        vx=self.rng.uniform(-0.2*v, 0.2*v)
         vy=v*dy
         vv=math.hypot(vx, vy)/v
         vx=vx/vv
@@ -591,6 +1264,8 @@ class Game:
 
     def on_ready(self):
         print('=== Ready to start ===')
+        self.events|=tracefile.EVENT_READY
+        self.first_serving_player=self.serving_player
         pf=self.playfield
         pf.set_text(0, self.score[0])
         pf.set_text(1, self.score[1])
@@ -601,6 +1276,7 @@ class Game:
         index=self.serving_player
         print('=== Preparing for service:', self.player_name[index],
               '===')
+        self.events|=tracefile.EVENT_PREPARE_SERVICE
         pf=self.playfield
         self.player_active=[False, False]
         self.waiting=True
@@ -616,8 +1292,8 @@ class Game:
         self.field_touch=False
         self.robot_touch=False
         self.concerned_player=-1
-        dt=random.uniform(0.5, 1.0)
-        self.schedule(self.on_serve_ball, dt)
+        self.events|=tracefile.EVENT_READY_TO_SERVE
+        self.schedule(self.on_serve_ball, self.get_serve_delay())
 
     def on_serve_ball(self):
         self.waiting=False
@@ -627,6 +1303,7 @@ class Game:
         pf=self.playfield
         v=self.get_service_velocity(index)
         pf.throw_ball(v) 
+        self.events|=tracefile.EVENT_SERVE
         
 
     def on_score_point(self):
@@ -635,6 +1312,7 @@ class Game:
         print('=== Point scored for player: ',
               self.player_name[player_index], '===')
         self.score[player_index]+=1
+        self.events|=tracefile.EVENT_POINT[player_index]
         pf=self.playfield
         pf.set_text(player_index, self.score[player_index])
         if self.score_limit and \
@@ -646,9 +1324,15 @@ class Game:
             
     def on_restart(self):
         self.waiting=True
+        self.events|=tracefile.EVENT_RESTART
         self.swap_serving_player()
         self.schedule(self.on_prepare_service, 0.1)
 
+    #ends the rally in play without scoring, like a void one, and goes on with the next service.
+    def abort_point(self):
+        self.waiting=True
+        self.schedule(self.on_restart)
+
     def on_terminate(self):
         reason=''
         if self.reason:
@@ -658,8 +1342,62 @@ class Game:
         print('=== Final score: ===')
         print('  ', self.score[0], 'points for', self.player_name[0])
         print('  ', self.score[1], 'points for', self.player_name[1])
+        self.events|=tracefile.EVENT_TERMINATE
+        if self.matches==0 or self.match_count<self.matches:
+            self.schedule(self.on_next_match, 1.0)
+        elif self.pooled:
+            self.schedule(self.on_release, 1.0)
+        else:
+            self.playfield.quit()
+
+    #the game fields of a match start again from scratch.
+    def reset_match(self):
+        self.score=[0, 0]
+        self.game_time=0.0
+        self.reason=None
+        self.game_started=False
+        self.waiting=True
+        self.waiting_service=False
+        self.player_active=[False, False]
+        self.concerned_player=-1
+        self.field_touch=False
+        self.robot_touch=False
+        self.serving_player=self.first_serving_player
+
+    def on_next_match(self):
+        self.match_count+=1
+        print('=== Starting match', self.match_count, '===')
+        self.restart_world(self.keep_players)
+
+    #a world of the matchmaker goes back to the pool: it stops being stepped until it gets new players.
+    def on_release(self):
+        self.match_count=1
+        self.restart_world(False)
         self.playfield.quit()
 
+    #resets the world and the game in place and adds the players again; the remote ones only if keep_remote.
+    def restart_world(self, keep_remote):
+        self.reset_match()
+        pf=self.playfield
+        pf.reset_world()
+        pf.set_text(0, 0)
+        pf.set_text(1, 0)
+        players=[(self.player[i], self.player_name[i]) for i in range(self.num_players)]
+        if not keep_remote:
+            for player, name in players:
+                if isinstance(player, RemotePlayerInterface):
+                    print('=== Dismissing player:', name, '===')
+                    player.on_quit()
+            players=[(player, name) for player, name in players if not isinstance(player, RemotePlayerInterface)]
+        self.player=[None, None]
+        self.player_name=[None, None]
+        self.num_players=0
+        for player, name in players:
+            self.add_player(player, name)
+        if self.num_players<self.players_needed:
+            pf.set_central_text('waiting for players')
+            print('=== Waiting for players ===')
+
 
 
 
@@ -675,6 +1413,7 @@ class NoBallGame(Game):
         self.waiting_service=False
         index=self.serving_player
         self.player_active[index]=True
+        self.events|=tracefile.EVENT_SERVE
 
     def get_service_position(self, index):
         return [0, 0, 3.0]
@@ -682,8 +1421,205 @@ class NoBallGame(Game):
 class SameServeGame(Game):
     def on_restart(self):
         self.waiting=True
+        self.events|=tracefile.EVENT_RESTART
         self.schedule(self.on_prepare_service, 0.1)
 
+#Training mode: every point starts from a random entry of a snapshot library, i.e. in the middle of a rally,
+#instead of going through the start positions and the service.
+class SnapshotGame(Game):
+    def __init__(self):
+        Game.__init__(self)
+        self.snapshot_library=None
+
+    def set_snapshot_library(self, library):
+        self.snapshot_library=library
+
+    def on_prepare_service(self):
+        lib=self.snapshot_library
+        name=lib.pick(self.rng) if lib is not None else None
+        if name is None:
+            Game.on_prepare_service(self)
+            return
+        info=lib.restore(self.playfield, name)
+        print('=== Starting from snapshot:', name, '===')
+        self.waiting=False
+        self.waiting_service=False
+        self.serving_player=info['serving_player']
+        self.concerned_player=info['concerned_player']
+        self.field_touch=info['field_touch']
+        self.robot_touch=info['robot_touch']
+        self.player_active=list(info['player_active'])
+        self.events|=tracefile.EVENT_SERVE
+
+#Training mode: the robots are teleported to the neutral position and the ball is served at the next tick,
+#instead of moving through the start positions and waiting a random time.
+class InstantServeGame(Game):
+    def on_prepare_service(self):
+        index=self.serving_player
+        print('=== Preparing for service:', self.player_name[index],
+              '===')
+        self.events|=tracefile.EVENT_PREPARE_SERVICE
+        pf=self.playfield
+        self.player_active=[False, False]
+        self.waiting=True
+        self.waiting_service=False
+        pf.set_update_state_callback(None)
+        jp=get_neutral_joint_position()
+        pf.reset_robot_joints(0, jp)
+        pf.reset_robot_joints(1, jp)
+        pf.hold_ball(self.get_service_position(index))
+        self.on_ready_to_serve()
+
+    #the held ball reaches the service position at the beginning of the next tick, it cannot be thrown before.
+    def get_serve_delay(self):
+        return self.playfield.dt
+
+    def on_restart(self):
+        self.waiting=True
+        self.events|=tracefile.EVENT_RESTART
+        self.swap_serving_player()
+        self.on_prepare_service()
+
+#Single player training mode: balls are fired at the player (the first and only one) from a configurable
+#distribution of shots, a new one as soon as the previous is over. A returned ball scores a point for the player,
+#a missed ball or an error a point for the drill; void serves score nothing. Every serve is reported.
+class ServeDrillGame(Game):
+    def __init__(self):
+        Game.__init__(self)
+        self.players_needed=1
+        self.drill=DRILL_DEFAULT
+        self.shot=0
+        self.serves=0
+        self.outcome=None
+        self.serve_velocity=None
+        self.serve_spin=None
+        self.last_serve_time=None
+        self.drill_stats={}
+
+    #the missing fields of the drill and of its shots take the default values (see check_drill).
+    def set_drill(self, drill):
+        self.drill=check_drill(drill)
+
+    def on_ready(self):
+        self.player_name[1]='Drill'
+        self.playfield.set_name(1, 'Drill')
+        Game.on_ready(self)
+
+    def to_world(self, x, y, z):
+        orig=self.playfield.get_player_origin(0)
+        return [x+orig[0], y+orig[1], z+orig[2]]
+
+    def on_prepare_service(self):
+        pf=self.playfield
+        shots=self.drill['shots']
+        self.shot=self.rng.choices(range(len(shots)), [shot['weight'] for shot in shots])[0]
+        shot=shots[self.shot]
+        self.events|=tracefile.EVENT_PREPARE_SERVICE
+        self.serving_player=1
+        self.waiting=False
+        self.waiting_service=True
+        self.player_active=[True, False]
+        self.concerned_player=-1
+        self.field_touch=False
+        self.robot_touch=False
+        if self.drill['reset_robot']:
+            pf.set_update_state_callback(None)
+            pf.reset_robot_joints(0, get_neutral_joint_position())
+        pos=shot['position']
+        rng=self.rng
+        px, py, pz=self.to_world(sample_range(pos['x'], rng), sample_range(pos['y'], rng), sample_range(pos['z'], rng))
+        target=shot['target']
+        tx, ty, tz=self.to_world(sample_range(target['x'], rng), sample_range(target['y'], rng), 0.0)
+        #flight time from the horizontal speed, then the vertical speed that brings the ball on the target.
+        t=math.hypot(tx-px, ty-py)/sample_range(shot['speed'], rng)
+        self.serve_velocity=[(tx-px)/t, (ty-py)/t, (tz-pz)/t+0.5*9.81*t]
+        spin=shot['spin']
+        self.serve_spin=[sample_range(spin['x'], rng), sample_range(spin['y'], rng), sample_range(spin['z'], rng)]
+        pf.hold_ball([px, py, pz])
+        delay=pf.dt
+        if self.last_serve_time is not None:
+            delay=max(delay, self.last_serve_time+self.drill['interval']-self.sched_time)
+        self.schedule(self.on_serve_ball, delay)
+
+    def on_serve_ball(self):
+        self.waiting=False
+        self.waiting_service=False
+        self.serves+=1
+        self.last_serve_time=self.sched_time
+        self.events|=tracefile.EVENT_SERVE
+        self.playfield.throw_ball(self.serve_velocity, self.serve_spin)
+
+    #the player is always on the negative y side; the other robot only stands there.
+    def update_play(self):
+        if self.waiting or self.waiting_service:
+            return
+        if self.time_limit and self.game_time>=self.time_limit:
+            self.waiting=True
+            self.reason='time limit was reached'
+            self.schedule(self.on_terminate)
+            return
+        pf=self.playfield
+        by=pf.ball_position[1]
+        outcome=None
+        if pf.contact_robot[0]:
+            if by>0.001:
+                outcome='error'
+            self.robot_touch=True
+        if outcome is None and pf.contact_table:
+            if by<0.0:
+                if self.robot_touch:
+                    outcome='error'
+                elif self.field_touch:
+                    outcome='missed'
+                else:
+                    self.field_touch=True
+                    self.concerned_player=0
+            elif self.robot_touch:
+                outcome='returned'
+            else:
+                outcome='void'
+        if outcome is None and (pf.contact_floor or pf.ball_away or pf.ball_stopped or pf.contact_robot[1]):
+            if self.robot_touch:
+                outcome='error'
+            elif self.field_touch:
+                outcome='missed'
+            else:
+                outcome='void'
+        if outcome:
+            self.waiting=True
+            self.outcome=outcome
+            self.schedule(self.on_serve_end)
+
+    def on_serve_end(self):
+        outcome=self.outcome
+        stats=self.drill_stats.setdefault(self.shot, dict.fromkeys(DRILL_OUTCOMES, 0))
+        stats[outcome]+=1
+        print('=== Serve', self.serves, '(shot %d):' % self.shot, outcome, '===')
+        if outcome!='void':
+            index=0 if outcome=='returned' else 1
+            self.score[index]+=1
+            self.events|=tracefile.EVENT_POINT[index]
+            self.playfield.set_text(index, self.score[index])
+            if self.score_limit and self.score[index]>=self.score_limit:
+                self.reason='score limit was reached'
+                self.schedule(self.on_terminate)
+                return
+        self.on_prepare_service()
+
+    def on_terminate(self):
+        print('=== Drill results: ===')
+        for shot in sorted(self.drill_stats):
+            stats=self.drill_stats[shot]
+            print('   shot %d:' % shot, ', '.join('%d %s' % (stats[o], o) for o in DRILL_OUTCOMES))
+        Game.on_terminate(self)
+
+    def reset_match(self):
+        Game.reset_match(self)
+        self.serves=0
+        self.outcome=None
+        self.last_serve_time=None
+        self.drill_stats={}
+
 class NormalGame(Game):
     pass
 
@@ -692,6 +1628,19 @@ class PlayerInterface:
     def update(self, state):
         pass
 
+    #The game delivers the state and collects the joints in two separate steps; by default they just call update().
+    #The state arrives as a numpy row, update() receives it as a list of floats.
+    def post_state(self, state):
+        self.posted_state=state.tolist()
+
+    def get_joints(self):
+        return self.update(self.posted_state)
+
+    #called instead of post_state on the ticks when the player gets no state (see Game.should_post_state), with
+    #the time elapsed; players that count time by the states received keep their clocks running here.
+    def skip_state(self, dt):
+        pass
+
     def on_quit(self):
         pass
 
@@ -706,35 +1655,128 @@ class RemotePlayerInterface(PlayerInterface):
         self.channel=channel
         self.name=name
         self.last_joints=get_neutral_joint_position()
+        self.tick=0
+        self.lockstep_deadline=None
+        self.lockstep_fallback='hold'
+        self.missed_deadlines=0
+        self.rollout_handler=None
+        self.index=0
+
+    def set_lockstep(self, deadline, fallback='hold'):
+        self.lockstep_deadline=deadline
+        self.lockstep_fallback=fallback
+
+    #handler(index, candidates, horizon) answers the rollout requests of the player (see Game.rollout).
+    def set_rollout_handler(self, handler, index):
+        self.rollout_handler=handler
+        self.index=index
+
+    #request: marker, horizon, K, then K joint vectors; reply: marker, K, then K results of ROLLOUT_RESULT_SIZE values.
+    #A request that does not decode, or with values that are not finite or a horizon that is not positive, gets an
+    #empty reply.
+    def answer_rollout(self, msg):
+        k=-1
+        if msg is not None and len(msg)>=ROLLOUT_HEADER and all(math.isfinite(v) for v in msg) and msg[1]>0.0:
+            k=int(msg[2])
+        if self.rollout_handler is None or k<1 or k>ROLLOUT_MAX_CANDIDATES or \
+                len(msg)!=ROLLOUT_HEADER+k*JOINTS:
+            print('** Received bad rollout request from', self.name, '**')
+            self.send([ROLLOUT_MARKER, 0])
+            return
+        candidates=[msg[ROLLOUT_HEADER+i*JOINTS:ROLLOUT_HEADER+(i+1)*JOINTS] for i in range(k)]
+        results=self.rollout_handler(self.index, candidates, msg[1])
+        reply=[ROLLOUT_MARKER, k]
+        for r in results:
+            reply+=r
+        self.send(reply)
 
     def update(self, state):
+        self.post_state(state)
+        return self.get_joints()
+
+    def post_state(self, state):
+        self.tick=int(state[STATE_TICK_INDEX])
         self.send(state)
+
+    def get_joints(self):
+        if self.lockstep_deadline:
+            return self.receive_lockstep()
         return self.receive()
 
     def on_quit(self):
+        if self.missed_deadlines:
+            print('=== Player', self.name, 'missed', self.missed_deadlines,
+                  'lockstep deadlines ===')
         self.channel.close()
 
     def send(self, state):
-        msg= channel.encode_float_list(state)
+        if isinstance(state, np.ndarray):
+            msg=state.astype(WIRE_FLOAT).tobytes()
+        else:
+            msg= channel.encode_float_list(state)
         self.channel.send(msg)
 
     def receive(self):
-        last_msg=self.channel.receive()
-        if last_msg is None:
-            return self.last_joints
+        last_msg=None
         msg=self.channel.receive()
         while msg is not None:
-            last_msg=msg
+            if msg[:4]==ROLLOUT_MARKER_BYTES:
+                self.answer_rollout(channel.decode_float_list(msg))
+            else:
+                last_msg=msg
             msg=self.channel.receive()
+        if last_msg is None:
+            return self.last_joints
         jp= channel.decode_float_list(last_msg)
-        if jp is None or len(jp)!=JOINTS:
+        if jp is None or len(jp) not in (JOINTS, JOINTS+1):
             print('** Received bad message from', self.name, '**')
         else:
-            self.last_joints=jp
+            self.last_joints=jp[:JOINTS]
+        return self.last_joints
+
+    #Waits for the joints answering the last posted state. Answers to older ticks are discarded; 
+    #if the deadline expires, the fallback policy decides the joints used for this tick.
+    def receive_lockstep(self):
+        deadline=time.time()+self.lockstep_deadline
+        while True:
+            timeout=deadline-time.time()
+            if timeout<=0.0:
+                break
+            msg=self.channel.receive(timeout)
+            if msg is None:
+                break
+            if msg[:4]==ROLLOUT_MARKER_BYTES:
+                #the time spent simulating is not charged to the player.
+                self.answer_rollout(channel.decode_float_list(msg))
+                deadline=time.time()+self.lockstep_deadline
+                continue
+            jp= channel.decode_float_list(msg)
+            if jp is None or len(jp) not in (JOINTS, JOINTS+1):
+                print('** Received bad message from', self.name, '**')
+                continue
+            #an echo that is not finite is discarded like a stale one.
+            if len(jp)==JOINTS+1 and (not math.isfinite(jp[JOINTS]) or int(jp[JOINTS])!=self.tick):
+                continue
+            self.last_joints=jp[:JOINTS]
+            return self.last_joints
+        self.missed_deadlines+=1
+        if self.lockstep_fallback=='neutral':
+            return get_neutral_joint_position()
         return self.last_joints
 
 
 
+GRAVITY=9.81
+
+#Closed-form flight of the ball under gravity alone (no drag, spin or bounce): the time for a ball at height z with
+#vertical velocity vz to come down to height h. It is the time of the apex if the ball never reaches h, 0 if it is
+#already below h and falling.
+def ballistic_descent_time(z, vz, h):
+    disc=vz*vz+2.0*GRAVITY*(z-h)
+    if disc<0.0:
+        return max(vz/GRAVITY, 0.0)
+    return max((vz+math.sqrt(disc))/GRAVITY, 0.0)
+
 class AutoPlayerInterface(PlayerInterface):
     def __init__(self):
         jp=get_neutral_joint_position()
@@ -756,7 +1798,7 @@ class AutoPlayerInterface(PlayerInterface):
         return jp
 
     def update(self, state):
-        self.freeze_stance-=DT
+        self.freeze_stance-=state[STATE_PERIOD_INDEX]
         px, py, pz=state[11:14]
         bx, by, bz=state[17:20]
         vx, vy, vz=state[20:23]
@@ -770,6 +1812,10 @@ class AutoPlayerInterface(PlayerInterface):
         self.choose_position(state, jp)
         return jp
 
+    #the stance stays frozen for a while, also on the ticks without a state.
+    def skip_state(self, dt):
+        self.freeze_stance-=dt
+
     def choose_stance(self, state):
         px, py, pz=state[11:14]
         bx, by, bz=state[17:20]
@@ -777,14 +1823,7 @@ class AutoPlayerInterface(PlayerInterface):
         dist=math.hypot(px-bx, py-by, pz-bz)
         if not state[28] or dist<0.1 or self.freeze_stance>0.0:
             return
-        g=9.81
-        d=0.05
-        minz=bz
-        while by>-0.5 and bz>0.0:
-            by+=vy*d
-            bz+=vz*d
-            vz-=g*d
-            minz=min(minz,bz)
+        minz, by=self.predict_flight(by, bz, vy, vz)
         curr=self.chosen_stance
         if minz>0.35:
             self.chosen_stance=2
@@ -801,6 +1840,15 @@ class AutoPlayerInterface(PlayerInterface):
         if self.chosen_stance!=curr:
             self.freeze_stance=0.75
 
+    #returns the lowest height of the ball and its y when it passes behind the robot (y=-0.5) or reaches the floor.
+    def predict_flight(self, by, bz, vy, vz):
+        t=0.0
+        if by>-0.5 and bz>0.0:
+            t=ballistic_descent_time(bz, vz, 0.0)
+            if vy<0.0:
+                t=min(t, (by+0.5)/-vy)
+        return min(bz, bz+vz*t-0.5*GRAVITY*t*t), by+vy*t
+
     def choose_position(self, state, jp):
         px, py, pz=state[11:14]
         bx, by, bz=state[17:20]
@@ -811,15 +1859,12 @@ class AutoPlayerInterface(PlayerInterface):
             jp[1]=bx
             return
         extra_y=0.0
-        if dist<vel*1.5*DT:
+        if dist<vel*1.5*state[STATE_PERIOD_INDEX]:
             extra_y=0.3
-        d=0.05
-        g=9.81
-        while vz>0 or bz+d*vz>=pz:
-            bx+=d*vx
-            by+=d*vy
-            bz+=d*vz
-            vz-=d*g
+        #where the ball comes down to the height of the paddle.
+        t=ballistic_descent_time(bz, vz, pz)
+        bx+=vx*t
+        by+=vy*t
         jp[1]=bx
         dy=py-state[0]
         jp[0]=by-dy+extra_y
@@ -840,6 +1885,29 @@ def parse_time(s):
     else:
         return int(f[1])+60*int(f[0])
 
+def parse_speed(s):
+    if s=='max':
+        return None
+    try:
+        speed=float(s)
+    except ValueError:
+        speed=0.0
+    if not math.isfinite(speed) or speed<=0.0:
+        print('*** Unvalid speed:', s)
+        sys.exit(1)
+    return speed
+
+#a finite number greater than 0; what names the value in the error message.
+def parse_positive(s, what):
+    try:
+        value=float(s)
+    except ValueError:
+        value=0.0
+    if not math.isfinite(value) or value<=0.0:
+        print('*** Unvalid %s:' % what, s)
+        sys.exit(1)
+    return value
+
 def parse_options():
     opt=Options(port=DEFAULT_PORT,
               time=None,
@@ -848,6 +1916,23 @@ def parse_options():
               swap=False,
               gui=True,
               font=1.0,
+              speed=1.0,
+              lockstep=None,
+              fallback='hold',
+              worlds=1,
+              profile='default',
+              record=None,
+              capture=None,
+              snapshots=None,
+              drill=None,
+              stats=None,
+              catchup='drop',
+              spectate=None,
+              repeat=1,
+              newplayers=False,
+              matchmaker=False,
+              idlefast=False,
+              spectaterate=SPECTATOR_RATE,
               players=[])
     n=len(sys.argv)
     i=1
@@ -868,17 +1953,91 @@ def parse_options():
             opt.game=NoBallGame
         elif a=='sameserve':
             opt.game=SameServeGame
+        elif a=='instant':
+            opt.game=InstantServeGame
+        elif a=='drill':
+            opt.game=ServeDrillGame
+        elif a=='drillconfig':
+            i+=1
+            opt.game=ServeDrillGame
+            try:
+                with open(sys.argv[i]) as f:
+                    opt.drill=check_drill(json.load(f))
+            except (OSError, ValueError) as e:
+                print('*** Unvalid drill configuration:', sys.argv[i], e)
+                sys.exit(1)
         elif a=='swap':
             opt.swap=True
         elif a=='dummy':
             opt.players.append(DummyPlayerInterface)
         elif a=='auto':
             opt.players.append(AutoPlayerInterface)
+        elif a=='policy':
+            i+=1
+            opt.players.append(policy_player_factory(os.path.abspath(sys.argv[i])))
         elif a=='nogui':
             opt.gui=False
         elif a=='font':
             i+=1
             opt.font=float(sys.argv[i])
+        elif a=='speed':
+            i+=1
+            opt.speed=parse_speed(sys.argv[i])
+        elif a=='lockstep':
+            i+=1
+            opt.lockstep=parse_positive(sys.argv[i], 'lockstep deadline')
+        elif a=='worlds':
+            i+=1
+            opt.worlds=int(sys.argv[i])
+            if opt.worlds<1:
+                print('*** Unvalid number of worlds:', sys.argv[i])
+                sys.exit(1)
+        elif a=='capture':
+            i+=1
+            opt.capture=sys.argv[i]
+        elif a=='snapshots':
+            i+=1
+            opt.snapshots=sys.argv[i]
+            opt.game=SnapshotGame
+        elif a=='repeat':
+            i+=1
+            opt.repeat=int(sys.argv[i])
+        elif a=='idlefast':
+            opt.idlefast=True
+        elif a=='matchmaker':
+            opt.matchmaker=True
+        elif a=='newplayers':
+            opt.newplayers=True
+        elif a=='spectate':
+            i+=1
+            opt.spectate=int(sys.argv[i])
+        elif a=='spectaterate':
+            i+=1
+            opt.spectaterate=parse_positive(sys.argv[i], 'spectator rate')
+        elif a=='catchup':
+            i+=1
+            opt.catchup=sys.argv[i]
+            if opt.catchup not in CATCHUP_POLICIES:
+                print('*** Unvalid catch-up policy:', sys.argv[i])
+                sys.exit(1)
+        elif a=='stats':
+            i+=1
+            opt.stats=float(sys.argv[i])
+        elif a=='record':
+            i+=1
+            opt.record=sys.argv[i]
+        elif a=='profile':
+            i+=1
+            opt.profile=sys.argv[i]
+            if opt.profile not in SIM_PROFILES:
+                print('*** Unvalid simulation profile:', sys.argv[i])
+                sys.exit(1)
+        elif a=='fallback':
+            i+=1
+            opt.fallback=sys.argv[i]
+            if opt.fallback not in LOCKSTEP_FALLBACKS:
+                print('*** Unvalid lockstep fallback:', sys.argv[i])
+                sys.exit(1)
         else:
             print('*** Unvalid command line option:', sys.argv[i])
             sys.exit(1)
@@ -886,25 +2045,73 @@ def parse_options():
     return opt
 
 
-def main():
-    global FONT_SIZE
-    opt=parse_options()
+#creates a game and its playfield as described by the command line options, accepting players on the given port.
+def create_match(opt, port, gui, dispatcher=True):
     ga=opt.game()
-    pf=Playfield(ga, opt.gui)
+    pf=Playfield(ga, gui, opt.profile)
+    pf.set_speed(opt.speed)
     if opt.time is not None:
         ga.set_time_limit(opt.time)
     if opt.score is not None:
         ga.set_score_limit(opt.score)
     if opt.swap:
         ga.swap_serving_player()
-    FONT_SIZE*=opt.font
+    if opt.lockstep is not None:
+        ga.set_lockstep(opt.lockstep, opt.fallback)
+    if opt.repeat!=1:
+        ga.set_repeat(opt.repeat, not opt.newplayers)
+    pf.catchup=opt.catchup
+    pf.idle_fast=opt.idlefast
+    if opt.stats is not None:
+        pf.enable_profiler('port %d' % port, opt.stats if opt.stats>0.0 else None)
+    if opt.record is not None:
+        path=opt.record
+        if opt.worlds>1 or opt.matchmaker:
+            root, ext=os.path.splitext(path)
+            path='%s_%d%s' % (root, port, ext)
+        ga.enable_recording(path)
+    if opt.capture is not None:
+        ga.enable_capture(snapshot_library.SnapshotLibrary(opt.capture, 'snap%d' % port))
+    if opt.drill is not None:
+        ga.set_drill(opt.drill)
+    if opt.snapshots is not None:
+        lib=snapshot_library.SnapshotLibrary(opt.snapshots)
+        if len(lib)==0:
+            print('--- Warning: no snapshots in', opt.snapshots, ', normal service used ---')
+        ga.set_snapshot_library(lib)
     i=0
     for p in opt.players:
         i+=1
         name='Player %d'%(i)
         ga.add_player(p(), name)
-    ga.enable_dispatcher(opt.port)
-    pf.run()
+    if dispatcher:
+        ga.enable_dispatcher(port)
+    if opt.spectate is not None:
+        ga.enable_spectators(opt.spectate+port-opt.port, opt.spectaterate)
+    return pf
+
+def main():
+    global FONT_SIZE
+    opt=parse_options()
+    FONT_SIZE*=opt.font
+    if opt.matchmaker:
+        if opt.gui:
+            print('--- Warning: GUI disabled with the matchmaker ---')
+        opt.gui=False
+        if opt.game().players_needed<=len(opt.players):
+            print('*** Unvalid matchmaker: the matches need no remote players')
+            sys.exit(1)
+        matchmaker=Matchmaker(opt)
+        print('=== Matchmaker waiting for players on port', opt.port, '===')
+        run_playfields([], matchmaker)
+        return
+    if opt.worlds>1 and opt.gui:
+        print('--- Warning: GUI disabled with multiple worlds ---')
+        opt.gui=False
+    playfields=[]
+    for k in range(opt.worlds):
+        playfields.append(create_match(opt, opt.port+k, opt.gui))
+    run_playfields(playfields)
 
 if __name__=='__main__':
     main()
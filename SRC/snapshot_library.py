@@ -0,0 +1,55 @@
+import json
+import os
+import random
+import pybullet as p
+
+SNAPSHOT_LIMIT=2000
+SNAPSHOT_EXT='.bullet'
+SNAPSHOT_INFO_EXT='.json'
+
+#An on-disk collection of physics states: every entry is a pybullet .bullet file plus a .json sidecar with what
+#pybullet does not save (the motor targets of the robots) and the game fields needed to resume the rally.
+#The states can only be restored in a playfield that loaded the same bodies in the same order.
+class SnapshotLibrary:
+    def __init__(self, directory, prefix='snap'):
+        self.directory=directory
+        self.prefix='%s_%d' % (prefix, os.getpid())
+        os.makedirs(directory, exist_ok=True)
+        self.entries=sorted(f[:-len(SNAPSHOT_INFO_EXT)] for f in os.listdir(directory)
+                            if f.endswith(SNAPSHOT_INFO_EXT))
+        self.captured=0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_full(self):
+        return len(self.entries)>=SNAPSHOT_LIMIT
+
+    #saves the current physics state of the playfield; info must be JSON serializable.
+    def capture(self, playfield, info):
+        if self.is_full():
+            return None
+        name='%s_%06d' % (self.prefix, self.captured)
+        self.captured+=1
+        base=os.path.join(self.directory, name)
+        p.saveBullet(base+SNAPSHOT_EXT, physicsClientId=playfield.client)
+        info=dict(info, motor_targets=[list(t) for t in playfield.motor_targets])
+        #the sidecar is written last: an entry is listed only once both files are complete.
+        with open(base+SNAPSHOT_INFO_EXT, 'w') as f:
+            json.dump(info, f)
+        self.entries.append(name)
+        return name
+
+    #a random entry, drawn with the given generator (the game's one, see Game.set_rng).
+    def pick(self, rng=random):
+        if not self.entries:
+            return None
+        return rng.choice(self.entries)
+
+    #restores an entry in the playfield and returns its info.
+    def restore(self, playfield, name):
+        base=os.path.join(self.directory, name)
+        with open(base+SNAPSHOT_INFO_EXT) as f:
+            info=json.load(f)
+        playfield.restore_state(base+SNAPSHOT_EXT, info['motor_targets'])
+        return info
@@ -0,0 +1,71 @@
+import os
+import random
+import sys
+
+import pytest
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+URDF_FILES = ['table.urdf', 'ball.urdf', 'robot.urdf', 'robot2.urdf']
+
+
+@pytest.fixture
+def world_dir(tmp_path, monkeypatch):
+    """
+    Runs the test in a directory where the server finds its URDF files, which it loads from
+    'Ping_Pong_Machine_learning\\SRC\\<name>' relative to the working directory.
+    """
+    for name in URDF_FILES:
+        link = tmp_path / ('Ping_Pong_Machine_learning\\SRC\\' + name)
+        if os.sep == '\\':
+            link.parent.mkdir(parents=True, exist_ok=True)
+        os.symlink(os.path.join(SRC_DIR, name), str(link))
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def to_close(world_dir):
+    """
+    The worlds built by the test, closed at its end.
+    """
+    objects = []
+    yield objects
+    for obj in reversed(objects):
+        obj.close()
+
+
+@pytest.fixture
+def make_world(to_close):
+    """
+    Builds headless worlds: make_world(game, players, profile, seed, idle_fast) returns the playfield of the game,
+    with the players added in order and the game choices drawn from random.Random(seed).
+    """
+    import server
+
+    def make(game, players=(), profile='default', seed=0, idle_fast=False):
+        game.set_rng(random.Random(seed))
+        pf = server.Playfield(game, False, profile)
+        pf.idle_fast = idle_fast
+        to_close.append(pf)
+        for k, player in enumerate(players):
+            game.add_player(player, 'Player {}'.format(k + 1))
+        return pf
+
+    return make
+
+
+@pytest.fixture
+def make_env(to_close):
+    """
+    Builds env.PingPongEnv objects with the given arguments.
+    """
+    import env
+
+    def make(**kwargs):
+        e = env.PingPongEnv(**kwargs)
+        to_close.append(e)
+        return e
+
+    return make
@@ -0,0 +1,38 @@
+import math
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def playfield(make_world):
+    return make_world(server.NormalGame(), profile='accurate')
+
+
+def test_contact_time_of_a_dropped_ball(playfield):
+    pf = playfield
+    drop = 0.5
+    pf.hold_ball([0.3, 0.5, server.TABLE_HEIGHT + server.BALL_RADIUS + drop])
+    pf.step()
+    release = pf.sim_time
+    pf.throw_ball([0.0, 0.0, 0.0])
+    for _ in range(100):
+        pf.step()
+        t = pf.get_contact_time(server.CONTACT_TABLE)
+        if t is not None:
+            break
+    assert t is not None
+    assert pf.get_contact_time(server.CONTACT_FLOOR) is None
+    assert pf.sim_time - pf.dt < t <= pf.sim_time
+    # pybullet finds the contacts before integrating a substep, so the contact is seen a substep after the ball
+    # reaches the table
+    fall = math.sqrt(2.0 * drop / server.GRAVITY)
+    assert release + fall <= t <= release + fall + 2.0 * pf.dt / pf.substeps
+
+
+def test_no_contact_time_without_contacts(playfield):
+    playfield.hold_ball([0.0, 0.0, 2.0])
+    playfield.step()
+    for bit in server.CONTACT_CATEGORIES:
+        assert playfield.get_contact_time(bit) is None
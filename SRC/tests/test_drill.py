@@ -0,0 +1,34 @@
+import pytest
+
+import server
+
+
+def test_partial_sections_are_merged_with_the_defaults():
+    drill = server.check_drill({'shots': [{'position': {'z': 0.4}, 'spin': {'x': 10.0}}]})
+    shot = drill['shots'][0]
+    assert shot['position'] == dict(server.DRILL_SHOT_DEFAULT['position'], z=0.4)
+    assert shot['spin'] == {'x': 10.0, 'y': 0.0, 'z': 0.0}
+    assert shot['target'] == server.DRILL_SHOT_DEFAULT['target']
+    assert drill['interval'] == server.DRILL_DEFAULT['interval']
+
+
+def test_set_drill_keeps_the_defaults_unchanged():
+    game = server.ServeDrillGame()
+    game.set_drill({'shots': [{'position': {'x': 0.1}}]})
+    assert server.DRILL_SHOT_DEFAULT['position']['x'] == [-0.3, 0.3]
+
+
+@pytest.mark.parametrize('drill, message', [
+    ({'shots': [{'position': {'x': 0.0, 'y': 0.4}, 'target': {'x': 0.0, 'y': [0.1, 0.7]}}]}, 'right below'),
+    ({'shots': [{'speed': 0.0}]}, 'speed'),
+    ({'shots': [{'target': {'y': [0.7, 0.1]}}]}, 'min greater than its max'),
+    ({'shots': [{'spin': {'w': 1.0}}]}, 'unknown field'),
+    ({'shots': [{'position': 'high'}]}, 'must be an object'),
+    ({'shots': [{'speed': float('nan')}]}, 'speed'),
+    ({'shots': []}, 'non-empty'),
+    ({'shots': [{'weight': 0.0}]}, 'weight'),
+    ({'interval': -1.0}, 'interval'),
+])
+def test_unplayable_drills_are_rejected(drill, message):
+    with pytest.raises(ValueError, match=message):
+        server.check_drill(drill)
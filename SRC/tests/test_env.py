@@ -0,0 +1,45 @@
+import math
+
+import server
+
+
+def service_distance(e):
+    origin = e.playfield.get_player_origin(e.game.serving_player)
+    x, y, z = e.playfield.ball_position
+    return math.hypot(y - origin[1], z - server.BALL_SERVICE_HEIGHT)
+
+
+def test_reset_after_truncation_serves_a_new_ball(make_env):
+    e = make_env(max_steps=20, seed=1)
+    e.reset()
+    score = list(e.game.score)
+    for _ in range(20):
+        _, _, done, info = e.step(server.get_neutral_joint_position())
+    assert done and info['truncated']
+    assert service_distance(e) > 0.5
+    e.reset()
+    assert e.steps == 0
+    assert service_distance(e) < 0.1
+    assert e.game.score == score
+
+
+def test_envs_with_the_same_seed_serve_the_same_balls(make_env):
+    a = make_env(seed=3)
+    b = make_env(seed=3)
+    c = make_env(seed=4)
+    serves = [e.reset()[17:23] for e in (a, b, c)]
+    assert (serves[0] == serves[1]).all()
+    assert not (serves[0] == serves[2]).all()
+
+
+def test_step_reports_the_contact_times(make_env):
+    e = make_env(seed=2)
+    e.reset()
+    seen = set()
+    done = False
+    while not done:
+        _, _, done, info = e.step(server.get_neutral_joint_position())
+        for name, t in info['contact_times'].items():
+            assert e.playfield.sim_time - e.playfield.dt < t <= e.playfield.sim_time
+            seen.add(name)
+    assert 'table' in seen
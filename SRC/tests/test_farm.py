@@ -0,0 +1,24 @@
+import farm
+
+
+def test_windows_client_commands_keep_their_backslashes(monkeypatch):
+    monkeypatch.setattr(farm, 'WINDOWS', True)
+    command = 'python .\\train_test\\paddle_train.py {name} {port}'.format(
+        name=farm.quote_argument('Client 2'), port=9600)
+    assert farm.split_command(command) == 'python .\\train_test\\paddle_train.py "Client 2" 9600'
+
+
+def test_posix_client_commands_are_split(monkeypatch):
+    monkeypatch.setattr(farm, 'WINDOWS', False)
+    command = 'python train_test/paddle_train.py {name} {port}'.format(
+        name=farm.quote_argument('Client 2'), port=9600)
+    assert farm.split_command(command) == ['python', 'train_test/paddle_train.py', 'Client 2', '9600']
+
+
+def test_unsupported_pinning_is_reported(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(farm, 'can_pin', lambda: False)
+    pool = farm.Farm(2, log_dir=str(tmp_path))
+    assert [w.core for w in pool.workers] == [None, None]
+    assert 'not pinned' in capsys.readouterr().out
+    farm.Farm(2, log_dir=str(tmp_path), pin=False)
+    assert 'not pinned' not in capsys.readouterr().out
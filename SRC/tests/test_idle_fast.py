@@ -0,0 +1,59 @@
+import pytest
+
+import server
+
+
+class Spectators:
+    """
+    Stands for the SpectatorDispatcher: somebody is always watching.
+    """
+
+    def __init__(self):
+        self.frames = 0
+
+    def has_spectators(self):
+        return True
+
+    def publish(self, frame):
+        self.frames += 1
+
+    def shutdown(self):
+        pass
+
+
+def auto_world(make_world, idle_fast):
+    players = [server.AutoPlayerInterface(), server.AutoPlayerInterface()]
+    return make_world(server.NormalGame(), players, idle_fast=idle_fast), players
+
+
+def test_skipped_ticks_keep_the_stance_clock(make_world):
+    normal, normal_players = auto_world(make_world, False)
+    fast, fast_players = auto_world(make_world, True)
+    idle = 0
+    for _ in range(1000):
+        normal.step()
+        fast.step()
+        idle += fast.idle
+        for a, b in zip(normal_players, fast_players):
+            assert b.freeze_stance == pytest.approx(a.freeze_stance, abs=1e-4)
+            assert b.chosen_stance == a.chosen_stance
+    assert idle > 100
+
+
+def test_idle_spectator_frames_are_thinned(make_world):
+    pf, _ = auto_world(make_world, True)
+    game = pf.game
+    game.spectators = Spectators()
+    game.spectator_interval = 2
+    prepared = []
+    prepare_state = game.prepare_state
+    game.prepare_state = lambda: prepared.append(pf.idle) or prepare_state()
+    idle = 0
+    for _ in range(1000):
+        pf.step()
+        idle += pf.idle
+    busy = 1000 - idle
+    assert idle > 100
+    assert game.spectators.frames <= busy // 2 + idle // (2 * server.IDLE_STATE_INTERVAL) + 2
+    # on idle ticks the state is built only for the players and the spectators that get it
+    assert prepared.count(True) <= idle // server.IDLE_STATE_INTERVAL + idle // (2 * server.IDLE_STATE_INTERVAL) + 2
@@ -0,0 +1,27 @@
+import pytest
+
+import server
+
+
+def parse(monkeypatch, *args):
+    monkeypatch.setattr('sys.argv', ['server.py'] + list(args))
+    return server.parse_options()
+
+
+@pytest.mark.parametrize('rate', ['0', '-5', 'nan', 'inf', 'fast'])
+def test_unvalid_spectator_rates_are_rejected(monkeypatch, capsys, rate):
+    with pytest.raises(SystemExit):
+        parse(monkeypatch, '-spectaterate', rate)
+    assert '*** Unvalid spectator rate' in capsys.readouterr().out
+
+
+def test_spectator_rate(monkeypatch):
+    assert parse(monkeypatch, '-spectaterate', '2.5').spectaterate == 2.5
+
+
+
+@pytest.mark.parametrize('deadline', ['0', '-1', 'nan', 'inf', 'soon'])
+def test_unvalid_lockstep_deadlines_are_rejected(monkeypatch, capsys, deadline):
+    with pytest.raises(SystemExit):
+        parse(monkeypatch, '-lockstep', deadline)
+    assert '*** Unvalid lockstep deadline' in capsys.readouterr().out
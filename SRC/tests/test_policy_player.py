@@ -0,0 +1,41 @@
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')
+
+import server
+from nets.arm_net import ArmModel
+from nets.ddpg import DDPG
+from policy_player import PolicyPlayerInterface
+from utilities import paddle_controller as pc
+from utilities.action_space import ActionSpaceArm, ActionSpacePaddleSmash, ActionSpacePaddleDontWait
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    """
+    A models directory with untrained checkpoints of the three networks.
+    """
+    for name, space in [(pc.SMASH_DIR, ActionSpacePaddleSmash()), (pc.DONT_WAIT_DIR, ActionSpacePaddleDontWait())]:
+        agent = DDPG(pc.GAMMA, pc.TAU, pc.HIDDEN_SIZE_PADDLE, pc.NUM_INPUTS_PADDLE, space,
+                     checkpoint_dir=str(tmp_path / name))
+        agent.save_checkpoint(0, 'test')
+    arm = ArmModel(pc.HIDDEN_SIZE_ARM, pc.NUM_INPUTS_ARM, ActionSpaceArm(), checkpoint_dir=str(tmp_path / pc.ARM_DIR))
+    arm.save_checkpoint(0, 'test')
+    return str(tmp_path)
+
+
+def test_policy_player_returns_the_joints(models_dir):
+    player = PolicyPlayerInterface(models_dir)
+    # the opponent hits the ball back toward the player: the arm network places the paddle
+    for vy in [3.0, -3.0]:
+        state = np.zeros(server.STATE_DIMENSION + 3, dtype=np.float32)
+        state[28] = 1.0
+        state[17:20] = [0.0, 0.8, 1.0]
+        state[20:23] = [0.0, vy, 1.0]
+        player.post_state(state)
+        joints = player.get_joints()
+        assert len(joints) == server.JOINTS
+        assert all(math.isfinite(v) for v in joints)
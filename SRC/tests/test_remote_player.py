@@ -0,0 +1,87 @@
+import math
+
+import pytest
+
+import channel
+import server
+
+
+class Channel:
+    """
+    Stands for a server channel: receive() returns the queued messages, then None.
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(channel.decode_float_list(message))
+
+    def receive(self, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    def close(self):
+        pass
+
+
+def rollout_request(horizon, k=1, candidates=None):
+    if candidates is None:
+        candidates = [server.get_neutral_joint_position()] * (k if math.isfinite(k) else 1)
+    msg = [server.ROLLOUT_MARKER, horizon, k]
+    for jp in candidates:
+        msg += jp
+    return channel.encode_float_list(msg)
+
+
+def make_player(messages, lockstep):
+    player = server.RemotePlayerInterface(Channel(messages), 'Client')
+    player.set_rollout_handler(lambda index, candidates, horizon: [(0, 0, 0, 0.0, 0.0, 0.0)] * len(candidates), 0)
+    if lockstep:
+        player.set_lockstep(0.01)
+    return player
+
+
+@pytest.mark.parametrize('lockstep', [False, True])
+@pytest.mark.parametrize('request_msg', [
+    rollout_request(float('nan')),
+    rollout_request(float('inf')),
+    rollout_request(-1.0),
+    rollout_request(0.5, k=float('nan')),
+    rollout_request(0.5, k=float('inf')),
+    server.ROLLOUT_MARKER_BYTES + b'\x00',
+])
+def test_bad_rollout_requests_get_an_empty_reply(request_msg, lockstep):
+    player = make_player([request_msg], lockstep)
+    player.get_joints()
+    assert player.channel.sent == [[server.ROLLOUT_MARKER, 0]]
+
+
+@pytest.mark.parametrize('lockstep', [False, True])
+def test_rollout_requests_are_answered(lockstep):
+    player = make_player([rollout_request(0.5, k=2)], lockstep)
+    player.get_joints()
+    reply = player.channel.sent[0]
+    assert reply[:2] == [server.ROLLOUT_MARKER, 2]
+    assert len(reply) == 2 + 2 * server.ROLLOUT_RESULT_SIZE
+
+
+@pytest.mark.parametrize('echo', [float('nan'), float('inf'), 6.0])
+@pytest.mark.parametrize('fallback', ['hold', 'neutral'])
+def test_bad_tick_echoes_fall_back(echo, fallback):
+    joints = [0.1] * server.JOINTS
+    player = server.RemotePlayerInterface(Channel([channel.encode_float_list(joints + [echo])]), 'Client')
+    player.set_lockstep(0.01, fallback)
+    player.tick = 7
+    expected = player.last_joints if fallback == 'hold' else server.get_neutral_joint_position()
+    assert player.get_joints() == expected
+    assert player.missed_deadlines == 1
+
+
+def test_answers_to_the_current_tick_are_played():
+    joints = [0.1] * server.JOINTS
+    player = server.RemotePlayerInterface(Channel([channel.encode_float_list(joints + [7.0])]), 'Client')
+    player.set_lockstep(0.01)
+    player.tick = 7
+    assert player.get_joints() == pytest.approx(joints)
+    assert player.missed_deadlines == 0
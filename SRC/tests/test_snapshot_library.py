@@ -0,0 +1,46 @@
+import random
+
+import server
+import snapshot_library
+
+
+def make_library(path, count=20):
+    for k in range(count):
+        (path / 'snap_{:02d}{}'.format(k, snapshot_library.SNAPSHOT_INFO_EXT)).write_text('{}')
+    return snapshot_library.SnapshotLibrary(str(path))
+
+
+def test_pick_uses_the_given_generator(tmp_path):
+    lib = make_library(tmp_path)
+    picks = [[lib.pick(rng) for _ in range(10)] for rng in (random.Random(5), random.Random(5))]
+    assert picks[0] == picks[1]
+    state = random.getstate()
+    lib.pick(random.Random(5))
+    assert random.getstate() == state
+
+
+class Library:
+    """
+    Stands for a SnapshotLibrary, recording the generator of the picks.
+    """
+
+    def __init__(self):
+        self.rngs = []
+
+    def pick(self, rng=random):
+        self.rngs.append(rng)
+        return 'snap'
+
+    def restore(self, playfield, name):
+        return {'serving_player': 0, 'concerned_player': -1, 'field_touch': False, 'robot_touch': False,
+                'player_active': [True, True]}
+
+
+def test_snapshot_game_picks_with_its_generator():
+    game = server.SnapshotGame()
+    game.set_playfield(None)
+    rng = random.Random(1)
+    game.set_rng(rng)
+    game.set_snapshot_library(Library())
+    game.on_prepare_service()
+    assert game.snapshot_library.rngs == [rng]
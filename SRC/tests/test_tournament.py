@@ -0,0 +1,29 @@
+import pytest
+
+import farm
+import tournament
+
+
+def make_job(players):
+    return farm.Job(players, [], '2 0')
+
+
+def test_job_matches_uses_the_server_names():
+    job = make_job(['auto', 'python client.py {name} {port}'])
+    result = {'matches': [{'names': ['Player 1', 'Client 2'], 'scores': [11, 7], 'game_time': 60.0},
+                          {'names': ['Client 2', 'Player 1'], 'scores': [11, 9], 'game_time': 70.0}]}
+    assert tournament.job_matches(job, result) == [(2, 11, 0, 7, 60.0), (0, 11, 2, 9, 70.0)]
+
+
+def test_job_matches_rejects_unknown_players():
+    job = make_job(['auto', 'python client.py {port}'])
+    result = {'names': ['Player 1', 'Client'], 'scores': [11, 7], 'game_time': 60.0}
+    with pytest.raises(ValueError, match='Client'):
+        tournament.job_matches(job, result)
+
+
+def test_client_commands_need_a_name(monkeypatch, capsys):
+    monkeypatch.setattr('sys.argv', ['tournament.py', '-players', 'auto', 'python client.py {port}'])
+    with pytest.raises(SystemExit):
+        tournament.main()
+    assert '{name}' in capsys.readouterr().out
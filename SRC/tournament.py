@@ -0,0 +1,295 @@
+"""
+
+    Machine Learning Project Work: Tennis Table Tournament
+    Group 2:
+        Ciaravola Giosuè - g.ciaravola3@studenti.unisa.it
+        Conato Christian - c.conato@studenti.unisa.it
+        Del Gaudio Nunzio - n.delgaudio5@studenti.unisa.it
+        Garofalo Mariachiara - m.garofalo38@studenti.unisa.it
+
+    ---------------------------------------------------------------
+
+    tournament.py
+
+    Round-robin tournament between a set of players (checkpoints, the
+    built-in players or external clients), played on a farm of headless
+    servers. Every pairing plays N matches, half of them with the sides
+    swapped, and the results are summarized in an Elo and win-rate table.
+
+"""
+
+import csv
+import itertools
+import os
+import sys
+import time
+
+import farm
+
+ELO_START = 1500.0
+ELO_K = 16.0
+
+
+class Entrant:
+    """
+    A player of the tournament.
+
+    Args:
+        spec (str): Player spec understood by farm.Job: 'auto', 'dummy', 'policy:<dir>' or a client command.
+        label (str, optional): Name shown in the tables; defaults to the checkpoint directory name, the
+                               script of a client command or the spec itself.
+    """
+
+    def __init__(self, spec, label=None):
+        self.spec = spec
+        if label is None:
+            if spec.startswith(farm.POLICY_PREFIX):
+                label = os.path.basename(os.path.normpath(spec[len(farm.POLICY_PREFIX):]))
+            elif farm.is_server_player(spec):
+                label = spec
+            else:
+                # external client: the name of its script
+                words = spec.split()
+                label = next((os.path.basename(w) for w in words if w.endswith('.py')), words[0])
+        self.label = label
+        self.elo = ELO_START
+        self.matches = 0
+        self.wins = 0
+        self.draws = 0
+        self.points_for = 0
+        self.points_against = 0
+
+    def win_rate(self):
+        """
+        Fraction of the matches won, a draw counting as half a win.
+        """
+        if not self.matches:
+            return 0.0
+        return (self.wins + 0.5 * self.draws) / self.matches
+
+
+def make_jobs(entrants, matches, server_args):
+    """
+    Builds the jobs of a round robin: for every pairing, one job per side, each one playing its share of the
+    matches in a single server process (server.py -repeat).
+
+    Args:
+        entrants (list): The Entrant objects.
+        matches (int): Matches per pairing.
+        server_args (list): Options for server.py, with the limits of every match.
+
+    Returns:
+        list: farm.Job objects; the label of a job is 'i j', the indexes of its two entrants in slot order.
+    """
+    jobs = []
+    for a, b in itertools.combinations(range(len(entrants)), 2):
+        for first, second, count in [(a, b, (matches + 1) // 2), (b, a, matches // 2)]:
+            if count == 0:
+                continue
+            args = list(server_args) + ['-repeat', str(count)]
+            jobs.append(farm.Job([entrants[first].spec, entrants[second].spec], args,
+                                 '{} {}'.format(first, second)))
+    return jobs
+
+
+def job_matches(job, result):
+    """
+    Converts the result of a job in (index_1, score_1, index_2, score_2, game_time) tuples, one per match,
+    with the entrants identified by the names they had in the server.
+
+    Raises:
+        ValueError: If a player of a match is not one of the entrants of the job, e.g. a client that did not
+                    connect with the name it was given.
+    """
+    indexes = [int(i) for i in job.label.split()]
+    by_name = dict(zip(farm.player_names(job.players), indexes))
+    matches = []
+    for match in result.get('matches', [result]):
+        names = match['names']
+        scores = match['scores']
+        for name in names:
+            if name not in by_name:
+                raise ValueError('unknown player {!r} (expected {})'.format(name, ', '.join(sorted(by_name))))
+        matches.append((by_name[names[0]], scores[0], by_name[names[1]], scores[1], match['game_time']))
+    return matches
+
+
+def update_ratings(entrants, index_1, score_1, index_2, score_2):
+    """
+    Adds a match to the statistics of the two entrants and updates their Elo ratings.
+    """
+    e1 = entrants[index_1]
+    e2 = entrants[index_2]
+    outcome = 0.5 if score_1 == score_2 else float(score_1 > score_2)
+    expected = 1.0 / (1.0 + 10.0 ** ((e2.elo - e1.elo) / 400.0))
+    delta = ELO_K * (outcome - expected)
+    e1.elo += delta
+    e2.elo -= delta
+    for e, own, other in [(e1, score_1, score_2), (e2, score_2, score_1)]:
+        e.matches += 1
+        e.points_for += own
+        e.points_against += other
+        if own > other:
+            e.wins += 1
+        elif own == other:
+            e.draws += 1
+
+
+def print_tables(entrants, pair_wins, pair_matches):
+    """
+    Prints the entrants by Elo rating and the table of the win rates of every pairing.
+    """
+    order = sorted(range(len(entrants)), key=lambda i: -entrants[i].elo)
+    width = max(len(e.label) for e in entrants)
+    print('=== Tournament ranking ===')
+    print('   {:>4}  {:<{w}}  {:>7} {:>7} {:>5} {:>5} {:>5} {:>7} {:>7}'.format(
+        'rank', 'player', 'elo', 'matches', 'won', 'drawn', 'lost', 'win %', 'points', w=width))
+    for rank, i in enumerate(order):
+        e = entrants[i]
+        print('   {:>4}  {:<{w}}  {:>7.1f} {:>7} {:>5} {:>5} {:>5} {:>7.1f} {:>+7d}'.format(
+            rank + 1, e.label, e.elo, e.matches, e.wins, e.draws, e.matches - e.wins - e.draws,
+            100.0 * e.win_rate(), e.points_for - e.points_against, w=width))
+    print('=== Win rate of the row against the column (%) ===')
+    print('   {:>4}  {:<{w}} '.format('', '', w=width) + ' '.join('{:>5}'.format(r + 1) for r in range(len(order))))
+    for rank, i in enumerate(order):
+        cells = []
+        for j in order:
+            n = pair_matches.get((i, j), 0)
+            cells.append('{:>5}'.format('-' if i == j or not n else '{:.0f}'.format(100.0 * pair_wins[(i, j)] / n)))
+        print('   {:>4}  {:<{w}} '.format(rank + 1, entrants[i].label, w=width) + ' '.join(cells))
+
+
+def write_results(path, entrants, matches):
+    """
+    Writes one line per match in a CSV file.
+    """
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['player_1', 'score_1', 'player_2', 'score_2', 'game_time'])
+        for index_1, score_1, index_2, score_2, game_time in matches:
+            writer.writerow([entrants[index_1].label, score_1, entrants[index_2].label, score_2, game_time])
+
+
+def run_tournament(entrants, matches, workers, server_args, base_port=farm.DEFAULT_BASE_PORT,
+                   log_dir='tournament_logs', pin=True, report='tournament_results.csv'):
+    """
+    Plays the round robin and prints the tables and the throughput.
+
+    Args:
+        entrants (list): The Entrant objects, updated with their statistics and ratings.
+        matches (int): Matches per pairing.
+        workers (int): Number of servers running at the same time, one core each.
+        server_args (list): Options for server.py (limits, speed, profile...).
+        base_port, log_dir, pin: See farm.Farm.
+        report (str, optional): CSV file with the result of every match.
+
+    Returns:
+        list: The matches played, as (index_1, score_1, index_2, score_2, game_time) tuples in schedule order.
+    """
+    jobs = make_jobs(entrants, matches, server_args)
+    pool = farm.Farm(workers, base_port, log_dir, pin)
+    start = time.time()
+    results = pool.run(jobs, lambda job, result: print('=== Pairing {} done ==='.format(job.label)))
+    elapsed = time.time() - start
+    # the ratings are computed in schedule order, so that they do not depend on which worker finished first
+    order = {id(job): k for k, job in enumerate(jobs)}
+    played = []
+    failed = 0
+    for job, result in sorted(results, key=lambda r: order[id(r[0])]):
+        if result is None:
+            failed += 1
+            continue
+        try:
+            played += job_matches(job, result)
+        except ValueError as e:
+            print('*** Pairing {} discarded: {}'.format(job.label, e))
+            failed += 1
+    pair_wins = {}
+    pair_matches = {}
+    for index_1, score_1, index_2, score_2, _ in played:
+        update_ratings(entrants, index_1, score_1, index_2, score_2)
+        for i, j, own, other in [(index_1, index_2, score_1, score_2), (index_2, index_1, score_2, score_1)]:
+            pair_matches[(i, j)] = pair_matches.get((i, j), 0) + 1
+            pair_wins[(i, j)] = pair_wins.get((i, j), 0.0) + (0.5 if own == other else float(own > other))
+    print_tables(entrants, pair_wins, pair_matches)
+    write_results(report, entrants, played)
+    rate = len(played) * 3600.0 / elapsed if elapsed > 0.0 else 0.0
+    print('=== {} matches played, {} jobs failed, {:.0f} s ==='.format(len(played), failed, elapsed))
+    print('   {:.1f} matches/hour, {:.1f} matches/hour/core'.format(rate, rate / max(workers, 1)))
+    print('   results written to', report)
+    return played
+
+
+def main():
+    '''
+    python tournament.py [-players P ...] [-checkpoints dir ...] [-matches N] [-workers K]
+                         [-port P] [-report file] [-logs dir] [-nopin] [-- server options]
+
+    Players are 'auto', 'dummy', 'policy:<dir>' or external client commands where
+    {port} and {name} are replaced ({name} is required: the results are assigned
+    by the name the client connects with); every directory given with -checkpoints
+    is a policy player (a directory with saved_models_arm, saved_models_smash and
+    saved_models_dont_wait). Every pairing plays N matches (default 10), half of
+    them with the sides swapped. Everything after -- is passed to server.py; the
+    default is "-score 11 -speed max".
+    '''
+    specs = []
+    matches = 10
+    workers = os.cpu_count() or 1
+    base_port = farm.DEFAULT_BASE_PORT
+    report = 'tournament_results.csv'
+    log_dir = 'tournament_logs'
+    pin = True
+    server_args = ['-score', '11', '-speed', 'max']
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        a = args[i].lstrip('-')
+        if args[i] == '--':
+            server_args = args[i + 1:]
+            break
+        elif a in ['players', 'checkpoints']:
+            while i + 1 < len(args) and not args[i + 1].startswith('-'):
+                i += 1
+                specs.append(args[i] if a == 'players' else farm.POLICY_PREFIX + os.path.abspath(args[i]))
+        elif a == 'matches':
+            i += 1
+            matches = int(args[i])
+        elif a == 'workers':
+            i += 1
+            workers = int(args[i])
+        elif a == 'port':
+            i += 1
+            base_port = int(args[i])
+        elif a == 'report':
+            i += 1
+            report = args[i]
+        elif a == 'logs':
+            i += 1
+            log_dir = args[i]
+        elif a == 'nopin':
+            pin = False
+        else:
+            print('*** Unvalid command line option:', args[i])
+            sys.exit(1)
+        i += 1
+    if len(specs) < 2:
+        print(main.__doc__)
+        sys.exit(1)
+    for spec in specs:
+        if not farm.is_server_player(spec) and '{name}' not in spec:
+            print('*** Client command without {name}, its matches could not be assigned:', spec)
+            sys.exit(1)
+    if '-score' not in server_args and '-time' not in server_args:
+        print('*** The matches need a -score or -time limit to end')
+        sys.exit(1)
+    entrants = [Entrant(spec) for spec in specs]
+    labels = [e.label for e in entrants]
+    for k, e in enumerate(entrants):
+        if labels.count(e.label) > 1:
+            e.label = '{}#{}'.format(e.label, k + 1)
+    run_tournament(entrants, matches, workers, server_args, base_port, log_dir, pin, report)
+
+
+if __name__ == '__main__':
+    main()
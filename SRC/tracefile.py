@@ -0,0 +1,194 @@
+import mmap
+import os
+import numpy as np
+
+TRACE_MAGIC=b'PPTRACE1'
+TRACE_VERSION=1
+TRACE_HEADER_SIZE=256
+TRACE_CHUNK_RECORDS=3000
+TRACE_NAME_LENGTH=48
+
+#game events, OR-ed in the record of the tick in which the corresponding Game callback ran.
+EVENT_READY=1
+EVENT_PREPARE_SERVICE=2
+EVENT_READY_TO_SERVE=4
+EVENT_SERVE=8
+EVENT_POINT=[16, 32]
+EVENT_RESTART=64
+EVENT_TERMINATE=128
+
+#the header occupies the first TRACE_HEADER_SIZE bytes of the file, all the values are little endian.
+TRACE_HEADER_DTYPE=np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('header_size', '<u4'),
+    ('record_size', '<u4'),
+    ('state_dimension', '<u4'),
+    ('joints', '<u4'),
+    ('substeps', '<u4'),
+    ('period', '<f8'),
+    ('count', '<u8'),
+    ('names', 'S%d'%TRACE_NAME_LENGTH, (2,)),
+])
+
+#returns the layout of one tick: every record has the same size, so record i starts at header_size+i*record_size.
+def make_record_dtype(state_dimension, joints):
+    return np.dtype([
+        ('tick', '<u4'),
+        ('events', '<u2'),
+        ('contacts', '<u1'),
+        ('active', '<u1'),
+        ('time', '<f8'),
+        ('states', '<f4', (2, state_dimension)),
+        ('joints', '<f4', (2, joints)),
+    ])
+
+
+#Appends one fixed-size record per tick to a memory-mapped file.
+#The file grows by TRACE_CHUNK_RECORDS records at a time and the record count in the header is updated at every
+#record, so a trace stays readable even if the server is killed; close() trims the unused tail.
+class TraceRecorder:
+    def __init__(self, path, state_dimension, joints, period=0.0, substeps=0):
+        self.path=path
+        self.dtype=make_record_dtype(state_dimension, joints)
+        self.count=0
+        self.capacity=0
+        self.mm=None
+        self.fields=None
+        self.file=open(path, 'w+b')
+        self.file.truncate(TRACE_HEADER_SIZE)
+        self.map(TRACE_CHUNK_RECORDS)
+        h=self.header
+        h['magic']=TRACE_MAGIC
+        h['version']=TRACE_VERSION
+        h['header_size']=TRACE_HEADER_SIZE
+        h['record_size']=self.dtype.itemsize
+        h['state_dimension']=state_dimension
+        h['joints']=joints
+        h['substeps']=substeps
+        h['period']=period
+        h['count']=0
+
+    #(re)maps the file with room for capacity records; the numpy views are dropped first, the old map cannot be
+    #closed while they exist.
+    def map(self, capacity):
+        self.drop_views()
+        if self.mm is not None:
+            self.mm.close()
+        self.file.truncate(TRACE_HEADER_SIZE+capacity*self.dtype.itemsize)
+        self.mm=mmap.mmap(self.file.fileno(), 0)
+        self.capacity=capacity
+        self.header=np.ndarray((), TRACE_HEADER_DTYPE, buffer=self.mm)
+        self.records=np.ndarray((capacity,), self.dtype, buffer=self.mm,
+                                offset=TRACE_HEADER_SIZE)
+        #one view per field, so that record() does not look up the fields at every tick.
+        self.fields={name: self.records[name] for name in self.dtype.names}
+
+    def drop_views(self):
+        self.header=None
+        self.records=None
+        self.fields=None
+
+    def set_names(self, names):
+        for i in [0, 1]:
+            self.header['names'][i]=str(names[i]).encode('utf8')[:TRACE_NAME_LENGTH]
+
+    #stores one tick; joints is a pair of joint lists, None for a missing player.
+    def record(self, time, states, joints, contacts=0, events=0, active=0):
+        if self.count==self.capacity:
+            self.map(self.capacity+TRACE_CHUNK_RECORDS)
+        n=self.count
+        f=self.fields
+        f['tick'][n]=n
+        f['events'][n]=events
+        f['contacts'][n]=contacts
+        f['active'][n]=active
+        f['time'][n]=time
+        f['states'][n]=states
+        for i in [0, 1]:
+            if joints[i] is not None:
+                f['joints'][n, i]=joints[i]
+        self.count=n+1
+        self.header['count']=self.count
+
+    def close(self):
+        if self.file is None:
+            return
+        self.drop_views()
+        self.mm.flush()
+        self.mm.close()
+        self.file.truncate(TRACE_HEADER_SIZE+self.count*self.dtype.itemsize)
+        self.file.close()
+        self.file=None
+        print('=== Trace of', self.count, 'ticks written to', self.path, '===')
+
+
+#Gives random access to a trace: the records are memory-mapped read-only and all have the same size, so seeking to
+#any tick costs the same wherever it is. The serve and point index is built once from the event column.
+class TraceReader:
+    def __init__(self, path):
+        self.path=path
+        header=np.fromfile(path, TRACE_HEADER_DTYPE, 1)
+        if len(header)==0 or header[0]['magic']!=TRACE_MAGIC:
+            raise ValueError('Not a trace file: '+path)
+        h=header[0]
+        if h['version']!=TRACE_VERSION:
+            raise ValueError('Unsupported trace version: %d' % h['version'])
+        self.state_dimension=int(h['state_dimension'])
+        self.joints=int(h['joints'])
+        self.period=float(h['period'])
+        self.substeps=int(h['substeps'])
+        self.names=[n.decode('utf8', 'replace') for n in h['names']]
+        self.dtype=make_record_dtype(self.state_dimension, self.joints)
+        if self.dtype.itemsize!=h['record_size']:
+            raise ValueError('Unvalid record size in '+path)
+        count=int(h['count'])
+        #the count in the header is updated at every tick, a killed recorder may leave fewer records than that on disk.
+        count=min(count, (os.path.getsize(path)-int(h['header_size']))//self.dtype.itemsize)
+        if count>0:
+            self.records=np.memmap(path, self.dtype, 'r', int(h['header_size']), (count,))
+        else:
+            self.records=np.zeros(0, self.dtype)
+        self.build_index()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, tick):
+        return self.records[tick]
+
+    #every rally is (serve tick, end tick, winner): it ends at the first point, restart or termination after the
+    #serve; the winner is -1 for a void rally or one cut by the end of the trace.
+    def build_index(self):
+        events=np.asarray(self.records['events'])
+        self.serves=np.flatnonzero(events & EVENT_SERVE)
+        self.points=np.flatnonzero(events & (EVENT_POINT[0] | EVENT_POINT[1]))
+        ends=np.flatnonzero(events & (EVENT_POINT[0] | EVENT_POINT[1] | EVENT_RESTART | EVENT_TERMINATE))
+        self.rallies=[]
+        for start, k in zip(self.serves, np.searchsorted(ends, self.serves, 'right')):
+            if k<len(ends):
+                end=int(ends[k])
+                if events[end] & EVENT_POINT[0]:
+                    winner=0
+                elif events[end] & EVENT_POINT[1]:
+                    winner=1
+                else:
+                    winner=-1
+            else:
+                end=len(events)-1
+                winner=-1
+            self.rallies.append((int(start), end, winner))
+
+    #returns the tick recorded at the given simulation time (the records are evenly spaced).
+    def tick_at(self, sim_time):
+        if len(self.records)==0:
+            return 0
+        tick=int(round((sim_time-self.records[0]['time'])/self.period))
+        return min(max(tick, 0), len(self.records)-1)
+
+    #returns the index of the rally being played at the given tick, or of the last one before it (-1 if none).
+    def rally_at(self, tick):
+        return int(np.searchsorted(self.serves, tick, 'right'))-1
+
+    def close(self):
+        self.records=None
@@ -0,0 +1,251 @@
+"""
+
+    Machine Learning Project Work: Tennis Table Tournament
+    Group 2:
+        Ciaravola Giosuè - g.ciaravola3@studenti.unisa.it
+        Conato Christian - c.conato@studenti.unisa.it
+        Del Gaudio Nunzio - n.delgaudio5@studenti.unisa.it
+        Garofalo Mariachiara - m.garofalo38@studenti.unisa.it
+
+    ---------------------------------------------------------------
+
+    paddle_controller.py
+
+    File containing the decision logic that uses the arm network and
+    the smash/don't wait agents to play, one state at a time. It is
+    shared by the client (arm_paddle_test.py) and by the in-process
+    policy player of the server (policy_player.py).
+
+"""
+
+import math
+import os
+
+import numpy as np
+import torch
+
+from nets.arm_net import ArmModel
+from nets.ddpg import DDPG
+from server import get_neutral_joint_position
+from utilities.action_space import ActionSpaceArm, ActionSpacePaddleSmash, ActionSpacePaddleDontWait
+from utilities.trajectory import trajectory, max_height_point
+
+# Set the device to GPU if available, otherwise use CPU
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Hyperparameters
+GAMMA = 0.99
+TAU = 0.01
+HIDDEN_SIZE_PADDLE = (200, 100, 50)
+NUM_INPUTS_PADDLE = 6
+HIDDEN_SIZE_ARM = (100, 50)
+NUM_INPUTS_ARM = 2
+
+# Checkpoint directories of the three networks, inside the models directory
+ARM_DIR = "saved_models_arm"
+SMASH_DIR = "saved_models_smash"
+DONT_WAIT_DIR = "saved_models_dont_wait"
+
+
+def load_models(models_dir=None):
+    """
+    Loads the latest checkpoints of the arm model and of the smash and don't wait agents, in evaluation mode.
+
+    Args:
+        models_dir (str, optional): Directory holding saved_models_arm, saved_models_smash and
+                                    saved_models_dont_wait. Defaults to the nets directory.
+
+    Returns:
+        tuple: arm model, smash agent and don't wait agent.
+    """
+    def checkpoint_dir(name):
+        return name if models_dir is None else os.path.join(models_dir, name)
+
+    smash_agent = DDPG(GAMMA, TAU, HIDDEN_SIZE_PADDLE, NUM_INPUTS_PADDLE, ActionSpacePaddleSmash(),
+                       checkpoint_dir=checkpoint_dir(SMASH_DIR))
+    smash_agent.load_checkpoint()
+    smash_agent.set_eval()
+
+    dont_wait_agent = DDPG(GAMMA, TAU, HIDDEN_SIZE_PADDLE, NUM_INPUTS_PADDLE, ActionSpacePaddleDontWait(),
+                           checkpoint_dir=checkpoint_dir(DONT_WAIT_DIR))
+    dont_wait_agent.load_checkpoint()
+    dont_wait_agent.set_eval()
+
+    arm_model = ArmModel(HIDDEN_SIZE_ARM, NUM_INPUTS_ARM, ActionSpaceArm(),
+                         checkpoint_dir=checkpoint_dir(ARM_DIR)).to(device)
+    arm_model.load_checkpoint()
+    arm_model.eval()
+
+    return arm_model, smash_agent, dont_wait_agent
+
+
+class PaddleController:
+    """
+    Chooses the joints of the robot from the state: the arm network places the paddle where the ball
+    will be hit (straight away, or after the bounce for a smash) and the paddle agents give the stroke.
+
+    Args:
+        models_dir (str, optional): Directory of the checkpoints (see load_models).
+        verbose (bool, optional): Whether to print the decisions taken.
+    """
+
+    def __init__(self, models_dir=None, verbose=True):
+        self.arm_model, self.smash_agent, self.dont_wait_agent = load_models(models_dir)
+        self.verbose = verbose
+        self.prev_state = None
+        self.action = get_neutral_joint_position()
+        self.reset_flags()
+
+    def reset_flags(self):
+        """
+        Forgets the decisions taken for the current ball.
+        """
+        self.out = False
+        self.serve = False
+        self.wait_bounce_to_smash = False
+        self.stance_chosen = False
+        self.hit = False
+        self.z = 0.5
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def arm_action(self, y, z):
+        """
+        Runs the arm model for a paddle position and returns the values of joints 0, 3, 5 and 7.
+        """
+        with torch.no_grad():
+            return self.arm_model(torch.Tensor([y, z])).tolist()
+
+    def set_arm(self, x, y, z):
+        arm_action = self.arm_action(y, z)
+        self.action[0] = arm_action[0]
+        self.action[1] = x
+        self.action[3] = arm_action[1]
+        self.action[5] = arm_action[2]
+        self.action[7] = arm_action[3]
+
+    def update(self, state):
+        """
+        Takes the decisions for a new state.
+
+        Args:
+            state (list or np.ndarray): The state received from the server; it is not modified.
+
+        Returns:
+            list: The 11 joint positions to send.
+        """
+        state = np.array(state, dtype=np.float64)
+        prev_state = self.prev_state
+        self.prev_state = state
+        if prev_state is None:
+            return list(self.action)
+        action = self.action
+
+        # Game start or the ball is going to the opponent (positive ball-y-velocity):
+        # - Reset all the flag to manage the game;
+        # - Take a good position to wait the activation
+        if (not prev_state[28] and state[28]) or (state[21] > 0 and prev_state[18] > 1.2):
+            self.set_arm(0, 0.8, 0.5)
+            action[9] = 1.1
+            action[10] = math.pi/2
+            self.reset_flags()
+
+        """Arm"""
+        # Activation:
+        # - If the ball is coming to us (negative ball-y-velocity);
+        # - And the game is playing;
+        # - And the ball is not going out
+        # - And the ball (pen) is on the table (negative ball-z-position)
+        if state[21] < 0 and state[28] and not self.out and state[19] > 0:
+            # In the state in which the opponent touch the ball
+            if (prev_state[21] * state[21]) <= 0:
+                # Check if is the serve
+                if prev_state[21] == 0:
+                    self.serve = True
+                # Calculate the trajectory to check if the ball go on our side of the table
+                x, y = trajectory(state)
+                if x is not None and y is not None:
+                    # If the ball is going out (Run away)
+                    if (x < -0.75 or x > 0.75) or (y < -0.2 or y > 1.2):
+                        self.log("RUN")
+                        action = self.action = get_neutral_joint_position()
+                        self.out = True
+                        if x <= 0:
+                            action[1] = 0.8
+                        else:
+                            action[1] = -0.8
+                    else:
+                        x_max, y_max, z_max = max_height_point(state)
+
+                        # if the ball is going in a good place with an high parable,
+                        # wait the bounce to smash
+                        if self.serve or (state[22] > 0 and y > 0.2 and z_max is not None and z_max >= 0.75):
+                            self.wait_bounce_to_smash = True
+                            action = self.action = get_neutral_joint_position()
+                        else:
+                            self.wait_bounce_to_smash = False
+
+                    # if the ball is not going out, and we have decided to not smash
+                    # and we don't have decided a stance yet
+                    if not self.out and not self.wait_bounce_to_smash and not self.stance_chosen:
+                        self.log("DON'T WAIT!")
+                        self.stance_chosen = True
+                        # We apply an offset on y in order to arrive to an optimal position,
+                        # cause of the inclination of the paddle during the supervised train of
+                        # the arm (0 angle)
+                        self.set_arm(x, y + 0.2, 0.5)
+                        action[9] = 1.1
+
+            # if the ball is not going out, and we have decided to smash
+            # and we don't have decided a stance yet and the ball is bounced
+            if not self.out and self.wait_bounce_to_smash and prev_state[22] < 0 and state[22] > 0 \
+                    and prev_state[18] < 1.2 and not self.stance_chosen:
+                # Scan the z to found the higher place to smash
+                x_smash, y_smash, z_smash = max_height_point(state)
+                while not self.stance_chosen:
+                    if x_smash is not None and y_smash is not None:
+                        if y_smash <= 0.2:
+                            self.stance_chosen = True
+                            # We apply an offset on y and z in order to arrive to an optimal position,
+                            # cause of the inclination of the paddle during the supervised train of
+                            # the arm (0 angle)
+                            y = y_smash + 0.15
+                            x = x_smash
+                            self.z = z_smash - 0.4
+                    else:
+                        z_smash -= 0.05
+                        x_smash, y_smash = trajectory(state, z_smash)
+
+                self.log("SMASH!")
+                self.set_arm(x, y, self.z)
+                # Calculate the z with this function in order to change the angle in function of
+                # the z to obtain the paddle perpendicular to the table
+                action[9] = (- 2.3) + ((self.z**2) * 1.3)
+
+            """Paddle"""
+            # Take the paddle and ball position to calculate the Euclidean distance,
+            # in order to activate the paddle networks
+            distance = np.linalg.norm(state[11:14] - state[17:20])
+
+            # Activation of the paddle networks if the ball is near the paddle
+            if distance <= 0.3 and self.stance_chosen and not self.hit:
+                # Build the input for the paddle agent
+                input_state_paddle = torch.Tensor(state[17:23]).to(device, dtype=torch.float32)
+
+                if not self.wait_bounce_to_smash and distance <= 0.2:
+                    self.hit = True
+                    # Calculate the action from the agent
+                    dont_wait_action = self.dont_wait_agent.calc_action(input_state_paddle)
+                    action[9] = 1.1 - float(dont_wait_action[0])
+                    action[10] = float(dont_wait_action[1])
+
+                if self.wait_bounce_to_smash:
+                    self.hit = True
+                    # Calculate the action from the agent
+                    smash_action = self.smash_agent.calc_action(input_state_paddle)
+                    action[9] = (- 2.3) + ((self.z**2) * 1.3) + float(smash_action[0])
+                    action[10] = float(smash_action[1])
+
+        return list(action)